@@ -16,18 +16,83 @@
 """
 
 # ---------------------------------- ИМПОРТ БИБЛИОТЕК ----------------------------------
-from dash import Dash, html, dcc, callback, Output, Input
+from dash import Dash, html, dcc, callback, Output, Input, ctx, no_update
 import plotly.express as px
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+import hashlib
+import io
+import json
+import os
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+try:
+    import fcntl
+except ImportError:  # Windows: режим общего снимка данных недоступен
+    fcntl = None
 
 # ---------------------------------- КОНСТАНТЫ И ПАРАМЕТРЫ ----------------------------------
 
 # URL набора данных
 DATASET_URL = 'https://raw.githubusercontent.com/plotly/datasets/master/gapminder_unfiltered.csv'
 
+# Локальный файл с набором данных для офлайн-режима (если задан, сеть не используется)
+DATASET_PATH = os.environ.get('GAPMINDER_DATASET_PATH')
+
+# Использовать локальный кэш без проверки актуальности по сети
+DATASET_OFFLINE = os.environ.get('GAPMINDER_OFFLINE', '') == '1'
+
+# Каталог локального кэша набора данных (столбцы в формате .npy)
+DATA_CACHE_DIR = os.environ.get(
+    'GAPMINDER_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.gapminder_cache')
+)
+
+# Таймаут запроса к DATASET_URL (секунды)
+DATASET_TIMEOUT = 30
+
+# Режим общего снимка данных: воркеры отображают в память одни и те же файлы столбцов
+SHARED_DATA = os.environ.get('GAPMINDER_SHARED_DATA', '') == '1'
+
+# Каталог общего снимка и его максимальный возраст (секунды), после которого
+# следующий запущенный воркер подготавливает данные заново
+SHARED_DATA_DIR = os.path.join(DATA_CACHE_DIR, 'shared')
+SHARED_DATA_MAX_AGE = int(os.environ.get('GAPMINDER_SHARED_MAX_AGE', '600'))
+
+# Максимальное число построенных графиков в кэше памяти процесса
+FIGURE_CACHE_SIZE = int(os.environ.get('GAPMINDER_FIGURE_CACHE_SIZE', '256'))
+
+# Файл SQLite для кэша графиков, общего для всех процессов (если не задан — только память)
+FIGURE_CACHE_DB = os.environ.get('GAPMINDER_FIGURE_CACHE_DB')
+
+# Максимальное число графиков в SQLite-кэше
+FIGURE_CACHE_DB_SIZE = int(os.environ.get('GAPMINDER_FIGURE_CACHE_DB_SIZE', '2048'))
+
+# Клиентский режим слайдеров года: данные по всем годам передаются на страницу один раз,
+# а графики со слайдером года перестраиваются в браузере без запросов к серверу
+CLIENTSIDE_SLIDERS = os.environ.get('GAPMINDER_CLIENTSIDE_SLIDERS', '') == '1'
+
+# Бюджет точек линейного графика: при превышении ряды прореживаются алгоритмом LTTB
+LINE_CHART_POINT_BUDGET = int(os.environ.get('GAPMINDER_LINE_POINT_BUDGET', '2000'))
+
+# Число точек, начиная с которого точечные и линейные графики рисуются через WebGL (scattergl)
+WEBGL_POINT_THRESHOLD = int(os.environ.get('GAPMINDER_WEBGL_THRESHOLD', '1000'))
+
+# Максимальное число кадров анимации пузырьковой диаграммы (при большем числе лет
+# годы прореживаются равномерно, чтобы объем передаваемых данных оставался ограниченным)
+ANIMATION_MAX_FRAMES = int(os.environ.get('GAPMINDER_ANIMATION_MAX_FRAMES', '30'))
+
 # Словарь для человекочитаемых названий метрик
 METRIC_LABELS = {
     'lifeExp': 'Продолжительность жизни (лет)',
@@ -35,6 +100,18 @@ METRIC_LABELS = {
     'gdpPercap': 'ВВП на душу населения (USD)'
 }
 
+# Компактные типы столбцов набора данных: строковые столбцы хранятся как категории,
+# численные — в минимально достаточной разрядности (население остается int64,
+# так как суммы по континентам выходят за пределы int32)
+DATA_SCHEMA = {
+    'country': 'category',
+    'continent': 'category',
+    'year': 'int32',
+    'pop': 'int64',
+    'lifeExp': 'float32',
+    'gdpPercap': 'float32'
+}
+
 # Цветовые схемы для разных графиков
 COLOR_SCHEME = {
     'line': px.colors.qualitative.Plotly,
@@ -140,24 +217,675 @@ STYLES = {
 
 # ---------------------------------- ЗАГРУЗКА И ПОДГОТОВКА ДАННЫХ ----------------------------------
 
+def _dataset_cache_key(value):
+    """
+    Формирует короткий ключ для имени каталога кэша
+    
+    Args:
+        value (str): Строка, из которой строится ключ
+    
+    Returns:
+        str: Шестнадцатеричный хэш
+    """
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:16]
+
+def write_columns(df, snapshot_dir):
+    """
+    Записывает столбцы DataFrame в каталог снимка
+    
+    Числовые столбцы записываются как .npy, строковые и категориальные — как коды
+    категорий (.npy) и список категорий. Каталог сначала собирается во временном
+    месте и затем переименовывается, поэтому одновременная запись из нескольких
+    процессов не приводит к порче снимка.
+    
+    Args:
+        df (pd.DataFrame): Данные для сохранения
+        snapshot_dir (str): Итоговый каталог снимка
+    """
+    if os.path.isdir(snapshot_dir):
+        return
+    
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(snapshot_dir))
+    columns = []
+    for position, column in enumerate(df.columns):
+        values = df[column]
+        file_path = os.path.join(tmp_dir, f'{position}.npy')
+        if pd.api.types.is_numeric_dtype(values):
+            np.save(file_path, values.to_numpy())
+            columns.append([column, None])
+        else:
+            categorical = pd.Categorical(values)
+            np.save(file_path, categorical.codes)
+            columns.append([column, categorical.categories.tolist()])
+    
+    with open(os.path.join(tmp_dir, 'columns.json'), 'w', encoding='utf-8') as f:
+        json.dump(columns, f, ensure_ascii=False)
+    
+    try:
+        os.rename(tmp_dir, snapshot_dir)
+    except OSError:
+        # Этот снимок уже сохранил другой процесс
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def read_columns(snapshot_dir):
+    """
+    Читает снимок столбцов, отображая файлы в память только для чтения
+    
+    Строковые столбцы восстанавливаются как pd.Categorical прямо поверх
+    отображенных в память кодов (без копии в каждом процессе).
+    
+    Args:
+        snapshot_dir (str): Каталог снимка
+    
+    Returns:
+        pd.DataFrame: Данные снимка
+    """
+    with open(os.path.join(snapshot_dir, 'columns.json'), encoding='utf-8') as f:
+        columns = json.load(f)
+    
+    data = {}
+    for position, (column, categories) in enumerate(columns):
+        values = np.load(os.path.join(snapshot_dir, f'{position}.npy'), mmap_mode='r')
+        if categories is not None:
+            # Проверка from_codes копирует коды, поэтому диапазон проверяем сами
+            if len(values) and (values.min() < -1 or values.max() >= len(categories)):
+                raise ValueError(f"{snapshot_dir}: коды столбца {column} вне списка категорий")
+            values = pd.Categorical.from_codes(values, categories, validate=False)
+        data[column] = values
+    
+    return pd.DataFrame(data, copy=False)
+
+def write_pointer(directory, pointer):
+    """
+    Атомарно записывает указатель на актуальный снимок (current.json)
+    
+    Args:
+        directory (str): Каталог со снимками
+        pointer (dict): Содержимое указателя
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(pointer, f)
+    os.replace(tmp_path, os.path.join(directory, 'current.json'))
+
+def read_pointer(directory):
+    """
+    Читает указатель на актуальный снимок
+    
+    Args:
+        directory (str): Каталог со снимками
+    
+    Returns:
+        dict: Содержимое указателя или None, если его нет
+    """
+    try:
+        with open(os.path.join(directory, 'current.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def snapshot_lock(directory):
+    """
+    Эксклюзивная блокировка каталога снимков между процессами
+    
+    Без fcntl (Windows) блокировка не выполняется.
+    
+    Args:
+        directory (str): Каталог со снимками
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def save_dataset_cache(df, source, validators):
+    """
+    Сохраняет исходный набор данных в локальный кэш
+    
+    Ключ снимка зависит от источника и валидаторов (ETag/Last-Modified или
+    mtime/размер файла). После публикации нового снимка прежние снимки того же
+    источника удаляются.
+    
+    Args:
+        df (pd.DataFrame): Загруженные данные
+        source (str): URL или путь к файлу с данными
+        validators (dict): Валидаторы версии источника
+    """
+    source_dir = os.path.join(DATA_CACHE_DIR, _dataset_cache_key(source))
+    os.makedirs(source_dir, exist_ok=True)
+    
+    snapshot = _dataset_cache_key(json.dumps([source, validators], sort_keys=True))
+    with snapshot_lock(source_dir):
+        write_columns(df, os.path.join(source_dir, snapshot))
+        write_pointer(source_dir, {'snapshot': snapshot, 'validators': validators})
+        
+        # Уже отображенные в память файлы прежних снимков остаются доступны процессам
+        for name in os.listdir(source_dir):
+            if name != snapshot and os.path.isdir(os.path.join(source_dir, name)):
+                shutil.rmtree(os.path.join(source_dir, name), ignore_errors=True)
+
+def load_dataset_cache(source):
+    """
+    Загружает исходный набор данных из локального кэша
+    
+    Args:
+        source (str): URL или путь к файлу с данными
+    
+    Returns:
+        tuple: (pd.DataFrame или None, если кэша нет; dict с валидаторами)
+    """
+    source_dir = os.path.join(DATA_CACHE_DIR, _dataset_cache_key(source))
+    if not os.path.isdir(source_dir):
+        return None, {}
+    
+    # Снимок отображается в память под блокировкой, чтобы его не удалили во время чтения
+    with snapshot_lock(source_dir):
+        pointer = read_pointer(source_dir)
+        if pointer is None:
+            return None, {}
+        
+        try:
+            df = read_columns(os.path.join(source_dir, pointer['snapshot']))
+        except (OSError, ValueError, KeyError):
+            return None, {}
+    return df, pointer['validators']
+
+def fetch_dataset(url, validators):
+    """
+    Загружает набор данных по URL с условной проверкой актуальности
+    
+    Args:
+        url (str): Адрес CSV-файла
+        validators (dict): Сохраненные ETag/Last-Modified
+    
+    Returns:
+        tuple: (pd.DataFrame или None, если данные не изменились; dict с новыми валидаторами)
+    """
+    request = urllib.request.Request(url)
+    if validators.get('etag'):
+        request.add_header('If-None-Match', validators['etag'])
+    if validators.get('last_modified'):
+        request.add_header('If-Modified-Since', validators['last_modified'])
+    
+    try:
+        with urllib.request.urlopen(request, timeout=DATASET_TIMEOUT) as response:
+            body = response.read()
+            new_validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+    except urllib.error.HTTPError as error:
+        if error.code == 304:
+            return None, validators
+        raise
+    
+    return pd.read_csv(io.BytesIO(body)), new_validators
+
+def read_dataset():
+    """
+    Читает набор данных, используя локальный кэш везде, где это возможно
+    
+    Если задан DATASET_PATH, данные читаются из локального файла (CSV разбирается
+    только при изменении файла). Иначе кэш проверяется условным запросом к
+    DATASET_URL; при недоступности сети используется сохраненная копия.
+    
+    Returns:
+        pd.DataFrame: Исходные данные Gapminder
+    """
+    if DATASET_PATH:
+        source = os.path.abspath(DATASET_PATH)
+        stat = os.stat(source)
+        validators = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        
+        cached, cached_validators = load_dataset_cache(source)
+        if cached is not None and cached_validators == validators:
+            return cached
+        
+        df = pd.read_csv(source)
+        save_dataset_cache(df, source, validators)
+        return df
+    
+    cached, cached_validators = load_dataset_cache(DATASET_URL)
+    if cached is not None and DATASET_OFFLINE:
+        return cached
+    
+    try:
+        df, validators = fetch_dataset(DATASET_URL, cached_validators if cached is not None else {})
+    except (urllib.error.URLError, OSError) as error:
+        if cached is None:
+            raise
+        print(f"Не удалось проверить актуальность данных ({error}), используется локальный кэш")
+        return cached
+    
+    if df is None:
+        return cached
+    
+    save_dataset_cache(df, DATASET_URL, validators)
+    return df
+
+def apply_schema(df):
+    """
+    Приводит столбцы к компактным типам из DATA_SCHEMA
+    
+    Фильтры и группировки по категориальным столбцам выполняются по целочисленным
+    кодам вместо сравнения строк.
+    
+    Args:
+        df (pd.DataFrame): Исходные данные
+    
+    Returns:
+        pd.DataFrame: Данные с компактными типами столбцов
+    """
+    memory_before = df.memory_usage(deep=True).sum()
+    df = df.astype({column: dtype for column, dtype in DATA_SCHEMA.items() if column in df.columns})
+    memory_after = df.memory_usage(deep=True).sum()
+    
+    print(f"Объем данных в памяти: {memory_before / 1024 ** 2:.2f} МБ -> {memory_after / 1024 ** 2:.2f} МБ")
+    return df
+
+def prepare_data(df):
+    """
+    Приводит типы столбцов и сортирует строки по году
+    
+    Args:
+        df (pd.DataFrame): Исходные данные
+    
+    Returns:
+        pd.DataFrame: Подготовленные данные
+    """
+    df = apply_schema(df)
+    
+    # Устойчивая сортировка сохраняет исходный порядок стран внутри каждого года
+    return df.sort_values('year', kind='stable', ignore_index=True)
+
+def load_shared_data():
+    """
+    Загружает подготовленные данные через общий для всех воркеров снимок
+    
+    Первый процесс, получивший блокировку, загружает и подготавливает данные и
+    записывает их столбцы (числовые значения и коды категорий) в SHARED_DATA_DIR.
+    Остальные процессы отображают эти файлы в память только для чтения, поэтому
+    страницы с данными разделяются между воркерами через страничный кэш ОС.
+    
+    Returns:
+        pd.DataFrame: Подготовленные данные, отображенные в память
+    """
+    if fcntl is None:
+        raise RuntimeError("Режим общего снимка данных требует POSIX-совместимой ОС")
+    
+    os.makedirs(SHARED_DATA_DIR, exist_ok=True)
+    with open(os.path.join(SHARED_DATA_DIR, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            pointer = read_pointer(SHARED_DATA_DIR)
+            if pointer is None or time.time() - pointer['created'] > SHARED_DATA_MAX_AGE:
+                data = prepare_data(read_dataset())
+                version = compute_dataset_version(data)
+                
+                if (pointer is not None and pointer.get('version') == version
+                        and os.path.isdir(os.path.join(SHARED_DATA_DIR, pointer['snapshot']))):
+                    # Данные не изменились — продлеваем текущий снимок вместо записи копии
+                    pointer = {**pointer, 'created': time.time()}
+                else:
+                    snapshot = f"{time.time_ns():x}"
+                    write_columns(data, os.path.join(SHARED_DATA_DIR, snapshot))
+                    
+                    # Старые снимки удаляем: уже отображенные в память файлы остаются доступны процессам
+                    for name in os.listdir(SHARED_DATA_DIR):
+                        if name != snapshot and os.path.isdir(os.path.join(SHARED_DATA_DIR, name)):
+                            shutil.rmtree(os.path.join(SHARED_DATA_DIR, name), ignore_errors=True)
+                    
+                    pointer = {'snapshot': snapshot, 'created': time.time(), 'version': version}
+                write_pointer(SHARED_DATA_DIR, pointer)
+            
+            # Снимок отображается в память до снятия блокировки: иначе другой воркер
+            # может успеть пересоздать данные и удалить этот каталог
+            return read_columns(os.path.join(SHARED_DATA_DIR, pointer['snapshot']))
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 def load_data():
     """
     Загружает и подготавливает набор данных Gapminder
     
+    Строки сортируются по году, чтобы данные каждого года занимали непрерывный
+    диапазон, и для них сразу строится индекс «год -> диапазон строк».
+    
     Returns:
-        pd.DataFrame: Данные Gapminder
+        tuple: (pd.DataFrame с данными Gapminder, dict с индексом по годам)
     """
     print("Загрузка набора данных Gapminder...")
-    df = pd.read_csv(DATASET_URL)
+    if SHARED_DATA:
+        df = load_shared_data()
+    else:
+        df = prepare_data(read_dataset())
+    year_index = build_year_index(df)
+        
+    print(f"Загружено {df.shape[0]} записей с данными о {df['country'].nunique()} странах за {len(year_index)} лет")
+    return df, year_index
+
+def build_year_index(df):
+    """
+    Строит индекс «год -> диапазон строк» для отсортированного по году DataFrame
+    
+    Args:
+        df (pd.DataFrame): Данные, отсортированные по столбцу year
+    
+    Returns:
+        dict: Словарь {год: slice} с границами строк каждого года
+    """
+    year_values = df['year'].to_numpy()
+    
+    # Границы диапазонов — позиции, где меняется значение года
+    starts = np.flatnonzero(np.diff(year_values)) + 1
+    starts = np.concatenate(([0], starts)) if len(year_values) else starts
+    stops = np.append(starts[1:], len(year_values))
+    
+    return {int(year_values[start]): slice(int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+def get_year_data(year):
+    """
+    Возвращает строки выбранного года без полного просмотра таблицы
+    
+    Args:
+        year (int): Год
+    
+    Returns:
+        pd.DataFrame: Срез данных за указанный год (пустой, если года нет в данных)
+    """
+    rows = year_index.get(year)
+    if rows is None:
+        return df.iloc[0:0]
+    return df.iloc[rows]
+
+def figure_values(values):
+    """
+    Готовит значения столбца к построению графика
+    
+    Столбцы float32 хранятся компактно, но в графике дали бы типизированные
+    массивы f4 и подсказки вида 43.82899856567383, поэтому переводятся в float64
+    с округлением до 3 знаков (как и в данных для клиентских графиков).
+    
+    Args:
+        values (np.ndarray): Значения столбца
+    
+    Returns:
+        np.ndarray: Значения для графика
+    """
+    if values.dtype == np.float32:
+        return np.round(values.astype('float64'), 3)
+    return values
+
+def figure_frame(data):
+    """
+    Возвращает данные для построения графика со столбцами float32, переведенными в float64
+    
+    Args:
+        data (pd.DataFrame): Данные (срез df)
+    
+    Returns:
+        pd.DataFrame: Данные для графика (исходный объект, если столбцов float32 нет)
+    """
+    columns = [column for column in data.columns if data[column].dtype == np.float32]
+    if not columns:
+        return data
+    return data.assign(**{column: figure_values(data[column].to_numpy()) for column in columns})
+
+# ---------------------------------- КУБ АГРЕГАТОВ ПО ГОДАМ ----------------------------------
+
+# Текущие данные и производные структуры (заполняются функцией reload_data)
+df = None
+year_index = {}
+
+# Зарегистрированные агрегации: {имя: функция(данные за год) -> результат}
+AGGREGATIONS = {}
+
+# Материализованные результаты агрегаций: {имя: {год: результат}}
+aggregates_cube = {}
+
+def materialize_aggregation(func):
+    """
+    Вычисляет агрегацию для каждого года из индекса
+    
+    Args:
+        func (callable): Функция, принимающая данные за один год
+    
+    Returns:
+        dict: Словарь {год: результат агрегации}
+    """
+    return {year: func(df.iloc[rows]) for year, rows in year_index.items()}
+
+def register_aggregation(name):
+    """
+    Декоратор для регистрации агрегации в кубе
+    
+    Агрегация вычисляется для всех лет при загрузке данных и пересчитывается
+    при их перезагрузке. Если данные уже загружены, результат материализуется сразу.
+    
+    Args:
+        name (str): Имя агрегации для последующего доступа через get_aggregate
+    
+    Returns:
+        callable: Декоратор
+    """
+    def decorator(func):
+        AGGREGATIONS[name] = func
+        if year_index:
+            aggregates_cube[name] = materialize_aggregation(func)
+        return func
+    return decorator
+
+def get_aggregate(name, year):
+    """
+    Возвращает заранее вычисленный результат агрегации за год
+    
+    Args:
+        name (str): Имя зарегистрированной агрегации
+        year (int): Год
+    
+    Returns:
+        Результат агрегации (для отсутствующего в данных года вычисляется на пустом срезе)
+    """
+    result = aggregates_cube.get(name, {}).get(year)
+    if result is None:
+        result = AGGREGATIONS[name](get_year_data(year))
+    return result
+
+def compute_dataset_version(df):
+    """
+    Вычисляет хэш версии данных для ключей кэша графиков
+    
+    Args:
+        df (pd.DataFrame): Подготовленные данные
+    
+    Returns:
+        str: Шестнадцатеричный хэш содержимого
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:16]
+
+def reload_data():
+    """
+    Загружает данные и пересобирает индекс по годам, куб агрегатов и версию данных
+    """
+    global df, year_index, aggregates_cube, dataset_version
+    df, year_index = load_data()
+    aggregates_cube = {name: materialize_aggregation(func) for name, func in AGGREGATIONS.items()}
+    dataset_version = compute_dataset_version(df)
+    clear_figure_cache()
+
+@register_aggregation("top15")
+def aggregate_top15(year_df):
+    """
+    Топ-15 стран по населению за год
+    
+    Args:
+        year_df (pd.DataFrame): Данные за один год
+    
+    Returns:
+        pd.DataFrame: 15 строк с наибольшим населением
+    """
+    return year_df.sort_values("pop", ascending=False).head(15)
+
+@register_aggregation("continent_pop")
+def aggregate_continent_pop(year_df):
+    """
+    Суммарное население континентов за год с долями в процентах
+    
+    Args:
+        year_df (pd.DataFrame): Данные за один год
+    
+    Returns:
+        pd.DataFrame: Столбцы continent, pop и percentage
+    """
+    continent_pop = year_df.groupby("continent", observed=True)["pop"].sum().reset_index()
+    total_pop = continent_pop["pop"].sum()
+    continent_pop["percentage"] = continent_pop["pop"].apply(lambda x: f"{x/total_pop:.1%}")
+    return continent_pop
+
+# ---------------------------------- КЭШ ГРАФИКОВ ----------------------------------
+
+# Версия текущих данных (входит в ключ кэша, заполняется функцией reload_data)
+dataset_version = None
+
+# LRU-кэш построенных графиков в памяти процесса: {ключ: figure}
+figure_cache = OrderedDict()
+figure_cache_lock = threading.Lock()
+
+# Счетчики обращений к кэшу графиков
+figure_cache_stats = {'hits': 0, 'db_hits': 0, 'misses': 0}
+
+# Соединения с SQLite-кэшем графиков (по одному на поток)
+figure_cache_db_local = threading.local()
+
+def clear_figure_cache():
+    """
+    Очищает кэш графиков в памяти процесса
+    """
+    with figure_cache_lock:
+        figure_cache.clear()
+
+def normalize_callback_args(args):
+    """
+    Приводит входные значения callback-функции к каноническому виду для ключа кэша
+    
+    Списки (например, выбранные страны) сортируются: порядок выбора не влияет
+    на построенный график.
     
-    # Преобразуем численные данные к соответствующим типам
-    if df['pop'].dtype != 'int64':
-        df['pop'] = df['pop'].astype('int64')
-    if df['year'].dtype != 'int64':
-        df['year'] = df['year'].astype('int64')
+    Args:
+        args (tuple): Входные значения callback-функции
+    
+    Returns:
+        list: Нормализованные значения
+    """
+    return [sorted(arg) if isinstance(arg, (list, tuple)) else arg for arg in args]
+
+def figure_cache_db():
+    """
+    Возвращает соединение текущего потока с SQLite-кэшем графиков
+    
+    Соединение открывается (и таблица создается) один раз на поток; после fork
+    воркер открывает собственное соединение.
+    
+    Returns:
+        sqlite3.Connection: Соединение с базой кэша
+    """
+    connection = getattr(figure_cache_db_local, 'connection', None)
+    if connection is None or figure_cache_db_local.pid != os.getpid():
+        connection = sqlite3.connect(FIGURE_CACHE_DB, timeout=5)
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS figures (key TEXT PRIMARY KEY, figure TEXT, accessed REAL)"
+            )
+        figure_cache_db_local.connection = connection
+        figure_cache_db_local.pid = os.getpid()
+    return connection
+
+def figure_cache_db_get(key):
+    """
+    Читает график из SQLite-кэша
+    
+    Args:
+        key (str): Ключ кэша
+    
+    Returns:
+        dict: График в виде словаря или None, если его нет в кэше
+    """
+    with figure_cache_db() as connection:
+        row = connection.execute("SELECT figure FROM figures WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE figures SET accessed = ? WHERE key = ?", (time.time(), key))
+    return json.loads(row[0])
+
+def figure_cache_db_put(key, fig):
+    """
+    Записывает график в SQLite-кэш, вытесняя давно не использовавшиеся записи
+    
+    Args:
+        key (str): Ключ кэша
+        fig (go.Figure): Построенный график
+    """
+    with figure_cache_db() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO figures (key, figure, accessed) VALUES (?, ?, ?)",
+            (key, fig.to_json(), time.time())
+        )
+        connection.execute(
+            "DELETE FROM figures WHERE key NOT IN "
+            "(SELECT key FROM figures ORDER BY accessed DESC LIMIT ?)",
+            (FIGURE_CACHE_DB_SIZE,)
+        )
+
+def cached_figure(func):
+    """
+    Декоратор, кэширующий графики, которые строит callback-функция
+    
+    Ключ кэша состоит из имени функции, версии данных и нормализованных входных
+    значений. Графики хранятся в LRU-кэше процесса и, если задан FIGURE_CACHE_DB,
+    в общем SQLite-кэше.
+    
+    Args:
+        func (callable): Callback-функция, возвращающая график
+    
+    Returns:
+        callable: Функция с кэшированием результата
+    """
+    @wraps(func)
+    def wrapper(*args):
+        key = json.dumps([func.__name__, dataset_version, normalize_callback_args(args)], default=str)
         
-    print(f"Загружено {df.shape[0]} записей с данными о {df['country'].nunique()} странах за {df['year'].nunique()} лет")
-    return df
+        with figure_cache_lock:
+            fig = figure_cache.get(key)
+            if fig is not None:
+                figure_cache.move_to_end(key)
+                figure_cache_stats['hits'] += 1
+                return fig
+        
+        fig = figure_cache_db_get(key) if FIGURE_CACHE_DB else None
+        if fig is not None:
+            stat = 'db_hits'
+        else:
+            stat = 'misses'
+            fig = func(*args)
+            if FIGURE_CACHE_DB:
+                figure_cache_db_put(key, fig)
+        
+        with figure_cache_lock:
+            figure_cache_stats[stat] += 1
+            figure_cache[key] = fig
+            figure_cache.move_to_end(key)
+            while len(figure_cache) > FIGURE_CACHE_SIZE:
+                figure_cache.popitem(last=False)
+        return fig
+    
+    return wrapper
 
 # ---------------------------------- ИНИЦИАЛИЗАЦИЯ ПРИЛОЖЕНИЯ ----------------------------------
 
@@ -170,11 +898,23 @@ app = Dash(
 # Настройка макета страницы
 app.config.suppress_callback_exceptions = True
 
-# Загрузка данных
-df = load_data()
+# Загрузка данных, индекса по годам и куба агрегатов
+reload_data()
+
+# Статистика кэша графиков
+@app.server.route("/_figure-cache-stats")
+def figure_cache_stats_view():
+    """
+    Возвращает счетчики попаданий и промахов кэша графиков
+    
+    Returns:
+        dict: Счетчики и текущий размер кэша процесса
+    """
+    with figure_cache_lock:
+        return {**figure_cache_stats, 'size': len(figure_cache), 'dataset_version': dataset_version}
 
 # Получение уникальных значений для элементов управления
-years = sorted(df['year'].unique())
+years = list(year_index)
 countries = sorted(df['country'].unique())
 
 # Опции для выпадающих списков метрик
@@ -323,6 +1063,16 @@ def create_bubble_chart_tab():
                         style=STYLES["slider"]
                     ),
                     
+                    # Режим анимации (в клиентском режиме слайдер и так работает без запросов к серверу)
+                    *([] if CLIENTSIDE_SLIDERS else [
+                        dcc.Checklist(
+                            id="bubble-animate",
+                            options=[{"label": " Анимация по годам", "value": "play"}],
+                            value=[],
+                            style=STYLES["dropdown"]
+                        )
+                    ]),
+                    
                     create_hint(
                         "Пузырьковая диаграмма позволяет анализировать сразу три метрики одновременно: "
                         "значения по осям X и Y, а также размер пузырька. Цвет пузырьков "
@@ -424,6 +1174,9 @@ def create_pie_chart_tab():
 
 # ---------------------------------- МАКЕТ ПРИЛОЖЕНИЯ ----------------------------------
 
+# Хранилище данных по годам для клиентского режима слайдеров
+year_payload_store = dcc.Store(id="year-payload")
+
 app.layout = html.Div([
     # Заголовок дашборда
     html.Div([
@@ -462,6 +1215,9 @@ app.layout = html.Div([
         ),
     ], style={"margin-bottom": "20px"}),
     
+    # Данные по годам для клиентских callback-функций (заполняются в build_year_payload)
+    *([year_payload_store] if CLIENTSIDE_SLIDERS else []),
+    
     # Нижний колонтитул
     html.Footer([
         html.P("Дашборд данных Gapminder — 2025"),
@@ -469,13 +1225,294 @@ app.layout = html.Div([
     ], style=STYLES["footer"])
 ], style=STYLES["container"])
 
+# ---------------------------------- ПРОРЕЖИВАНИЕ ВРЕМЕННЫХ РЯДОВ ----------------------------------
+
+def render_mode_for(point_count):
+    """
+    Выбирает способ отрисовки графика по числу точек
+    
+    Args:
+        point_count (int): Число точек на графике
+    
+    Returns:
+        str: "webgl" выше порога WEBGL_POINT_THRESHOLD, иначе "svg"
+    """
+    return "webgl" if point_count > WEBGL_POINT_THRESHOLD else "svg"
+
+def lttb_indices(x, y, threshold):
+    """
+    Выбирает точки ряда алгоритмом Largest-Triangle-Three-Buckets
+    
+    Точки (кроме первой и последней) делятся на threshold - 2 корзины; средние
+    значения корзин вычисляются векторно, а в каждой корзине выбирается точка,
+    образующая наибольший треугольник с предыдущей выбранной точкой и средним
+    следующей корзины.
+    
+    Args:
+        x (np.ndarray): Значения по оси X (упорядоченные)
+        y (np.ndarray): Значения по оси Y
+        threshold (int): Число точек после прореживания
+    
+    Returns:
+        np.ndarray: Позиции выбранных точек (при threshold < 3 — равномерно
+            расположенные точки, начиная с первой)
+    """
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.unique(np.linspace(0, n - 1, max(threshold, 1)).round().astype(int))
+    
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    
+    # Границы корзин и их средние значения
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    
+    # Для последней корзины «следующей» служит последняя точка ряда
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+    
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[a] - next_x[bucket]) * (y[start:stop] - y[a])
+            - (x[a] - x[start:stop]) * (next_y[bucket] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+    
+    return selected
+
+def downsample_series(data, x, y, group, budget):
+    """
+    Прореживает ряды каждой группы так, чтобы общее число точек не превышало бюджет
+    
+    Args:
+        data (pd.DataFrame): Данные, упорядоченные по x внутри каждой группы
+        x (str): Столбец оси X
+        y (str): Столбец оси Y
+        group (str): Столбец группировки (один ряд на группу)
+        budget (int): Бюджет точек на весь график
+    
+    Returns:
+        pd.DataFrame: Прореженные данные (исходные, если бюджет не превышен)
+    """
+    if len(data) <= budget:
+        return data
+    
+    groups = data.groupby(group, observed=True).indices
+    # Бюджет делится поровну; рядов больше, чем точек в бюджете, быть не должно —
+    # иначе на каждый ряд остается минимум одна точка
+    per_series = max(budget // max(len(groups), 1), 1)
+    x_values = data[x].to_numpy()
+    y_values = data[y].to_numpy()
+    
+    positions = [rows[lttb_indices(x_values[rows], y_values[rows], per_series)] for rows in groups.values()]
+    return data.iloc[np.sort(np.concatenate(positions))]
+
+# ---------------------------------- АНИМАЦИЯ ПУЗЫРЬКОВОЙ ДИАГРАММЫ ----------------------------------
+
+def decimate_years(all_years, max_frames):
+    """
+    Равномерно прореживает список лет до заданного числа кадров
+    
+    Args:
+        all_years (list): Отсортированный список лет
+        max_frames (int): Максимальное число кадров
+    
+    Returns:
+        list: Выбранные годы (первый и последний год сохраняются всегда)
+    """
+    if len(all_years) <= max_frames:
+        return list(all_years)
+    positions = np.unique(np.linspace(0, len(all_years) - 1, max_frames).round().astype(int))
+    return [all_years[position] for position in positions]
+
+def axis_range(values, use_log):
+    """
+    Вычисляет фиксированный диапазон оси для всех кадров анимации
+    
+    Args:
+        values (np.ndarray): Значения по оси
+        use_log (bool): Логарифмическая шкала
+    
+    Returns:
+        list: Границы диапазона (для логарифмической шкалы — в степенях 10)
+    """
+    if use_log:
+        values = np.log10(values[values > 0])
+    low, high = float(values.min()), float(values.max())
+    padding = (high - low) * 0.05 or 1
+    return [low - padding, high + padding]
+
+@cached_figure
+def build_bubble_animation(x_axis, y_axis, size):
+    """
+    Строит анимированную пузырьковую диаграмму с кадрами по годам
+    
+    Все кадры собираются за один проход: строки выбранных лет один раз
+    сортируются по паре (год, континент) и разбиваются на группы по границам ключа.
+    
+    Args:
+        x_axis (str): Метрика для оси X
+        y_axis (str): Метрика для оси Y
+        size (str): Метрика для размера пузырьков
+    
+    Returns:
+        go.Figure: Диаграмма с кадрами анимации
+    """
+    frame_years = decimate_years(years, ANIMATION_MAX_FRAMES)
+    continents = df['continent'].cat.categories.tolist()
+    
+    # Строки выбранных лет, упорядоченные по (год, континент)
+    year_values = df['year'].to_numpy()
+    continent_codes = df['continent'].cat.codes.to_numpy()
+    rows = np.flatnonzero(np.isin(year_values, frame_years))
+    rows = rows[np.lexsort((continent_codes[rows], year_values[rows]))]
+    
+    columns = {
+        'x': figure_values(df[x_axis].to_numpy()[rows]),
+        'y': figure_values(df[y_axis].to_numpy()[rows]),
+        'size': figure_values(df[size].to_numpy()[rows]),
+        'country': df['country'].to_numpy()[rows]
+    }
+    group_years = year_values[rows]
+    group_continents = continent_codes[rows]
+    
+    # Границы групп — позиции, где меняется год или континент
+    boundaries = np.flatnonzero((np.diff(group_years) != 0) | (np.diff(group_continents) != 0)) + 1
+    groups = {}
+    for start, stop in zip(np.concatenate(([0], boundaries)), np.append(boundaries, len(rows))):
+        if stop > start:
+            groups[(int(group_years[start]), int(group_continents[start]))] = slice(start, stop)
+    
+    use_log_x = x_axis in ["pop", "gdpPercap"]
+    use_log_y = y_axis in ["pop", "gdpPercap"]
+    sizeref = float(columns['size'].max()) / (50 ** 2) if len(rows) else 1
+    
+    # WebGL выбирается по размеру одного кадра; такие кадры требуют полной перерисовки
+    use_webgl = render_mode_for(len(rows) / max(len(frame_years), 1)) == "webgl"
+    scatter_trace = go.Scattergl if use_webgl else go.Scatter
+    hovertemplate = (
+        "<b>%{hovertext}</b><br><br>Континент=%{fullData.name}<br>"
+        f"{METRIC_LABELS.get(x_axis, x_axis)}=%{{x}}<br>"
+        f"{METRIC_LABELS.get(y_axis, y_axis)}=%{{y}}<br>"
+        f"{METRIC_LABELS.get(size, size)}=%{{marker.size}}<extra></extra>"
+    )
+    
+    def frame_traces(year):
+        """Трассы всех континентов за год (пустые для отсутствующих — число трасс постоянно)"""
+        traces = []
+        for code, continent in enumerate(continents):
+            group = groups.get((year, code), slice(0, 0))
+            traces.append(scatter_trace(
+                x=columns['x'][group],
+                y=columns['y'][group],
+                hovertext=columns['country'][group],
+                name=continent,
+                legendgroup=continent,
+                mode="markers",
+                marker=dict(
+                    size=columns['size'][group],
+                    sizemode="area",
+                    sizeref=sizeref,
+                    color=COLOR_SCHEME["bubble"][code % len(COLOR_SCHEME["bubble"])],
+                    opacity=0.8
+                ),
+                hovertemplate=hovertemplate
+            ))
+        return traces
+    
+    frames = [
+        go.Frame(
+            data=frame_traces(year),
+            name=str(year),
+            layout={"annotations": [{
+                "x": 0.5, "y": 1.12, "xref": "paper", "yref": "paper",
+                "text": f"Данные за {year} год", "showarrow": False,
+                "font": {"size": 14, "color": "#34495e"}
+            }]}
+        )
+        for year in frame_years
+    ]
+    
+    fig = go.Figure(data=frames[0].data if frames else [], frames=frames)
+    fig.update_layout(
+        title=f"Изменение показателей стран с {frame_years[0]} по {frame_years[-1]} год" if frames else "",
+        template="plotly_white",
+        legend={"title": "Континенты", "orientation": "h", "y": -0.3, "x": 0.5, "xanchor": "center"},
+        hovermode="closest",
+        plot_bgcolor="rgba(240, 240, 240, 0.5)",
+        annotations=frames[0].layout.annotations if frames else [],
+        updatemenus=[{
+            "type": "buttons",
+            "direction": "left",
+            "x": 0.1, "y": -0.1, "xanchor": "right", "yanchor": "top",
+            "buttons": [
+                {"label": "▶", "method": "animate",
+                 "args": [None, {"frame": {"duration": 500, "redraw": use_webgl}, "fromcurrent": True,
+                                 "transition": {"duration": 300}}]},
+                {"label": "❚❚", "method": "animate",
+                 "args": [[None], {"frame": {"duration": 0, "redraw": use_webgl}, "mode": "immediate"}]}
+            ]
+        }],
+        sliders=[{
+            "x": 0.1, "y": -0.1, "len": 0.9, "yanchor": "top",
+            "currentvalue": {"prefix": "Год: "},
+            "steps": [
+                {"label": str(year), "method": "animate",
+                 "args": [[str(year)], {"frame": {"duration": 0, "redraw": use_webgl}, "mode": "immediate"}]}
+                for year in frame_years
+            ]
+        }]
+    )
+    
+    # Фиксированные диапазоны осей, чтобы масштаб не менялся между кадрами
+    fig.update_xaxes(
+        title=METRIC_LABELS.get(x_axis, x_axis),
+        type="log" if use_log_x else "linear",
+        range=axis_range(columns['x'], use_log_x) if len(rows) else None,
+        gridcolor="rgba(200, 200, 200, 0.2)"
+    )
+    fig.update_yaxes(
+        title=METRIC_LABELS.get(y_axis, y_axis),
+        type="log" if use_log_y else "linear",
+        range=axis_range(columns['y'], use_log_y) if len(rows) else None,
+        gridcolor="rgba(200, 200, 200, 0.2)"
+    )
+    
+    return fig
+
 # ---------------------------------- CALLBACK ФУНКЦИИ ----------------------------------
 
+def year_slider_callback(*args, **kwargs):
+    """
+    Регистрирует серверный callback графика со слайдером года
+    
+    В клиентском режиме (CLIENTSIDE_SLIDERS) функция не регистрируется как callback:
+    график строится в браузере, а сама функция используется для построения
+    базового оформления графика.
+    
+    Returns:
+        callable: Декоратор
+    """
+    if CLIENTSIDE_SLIDERS:
+        return lambda func: func
+    return callback(*args, **kwargs)
+
 @callback(
     Output("line-chart", "figure"),
     [Input("line-country-selection", "value"),
      Input("line-y-axis-selection", "value")]
 )
+@cached_figure
 def update_line_chart(countries, y_axis):
     """
     Обновляет линейный график на основе выбранных стран и метрики
@@ -499,11 +1536,16 @@ def update_line_chart(countries, y_axis):
         return fig
     
     # Фильтрация данных по выбранным странам
-    filtered_df = df[df["country"].isin(countries)]
+    filtered_df = figure_frame(df[df["country"].isin(countries)])
+    
+    # Прореживание плотных рядов до бюджета точек графика
+    plot_df = downsample_series(filtered_df, "year", y_axis, "country", LINE_CHART_POINT_BUDGET)
+    is_downsampled = len(plot_df) < len(filtered_df)
+    render_mode = render_mode_for(len(plot_df))
     
     # Создание линейного графика с улучшенным форматированием
     fig = px.line(
-        filtered_df, 
+        plot_df, 
         x="year", 
         y=y_axis, 
         color="country",
@@ -515,8 +1557,10 @@ def update_line_chart(countries, y_axis):
         title=f"Динамика показателя «{METRIC_LABELS.get(y_axis, y_axis)}» по странам",
         color_discrete_sequence=COLOR_SCHEME["line"],
         template="plotly_white",
-        markers=True,  # Добавляем маркеры для улучшения читаемости точек
-        line_shape="spline"  # Сглаживаем линии для лучшего восприятия
+        markers=not is_downsampled,  # Добавляем маркеры для улучшения читаемости точек
+        # Сглаживаем линии для лучшего восприятия (WebGL поддерживает только прямые отрезки)
+        line_shape="linear" if is_downsampled or render_mode == "webgl" else "spline",
+        render_mode=render_mode
     )
     
     # Настройка внешнего вида графика
@@ -539,16 +1583,28 @@ def update_line_chart(countries, y_axis):
         font=dict(size=12)
     )
     
+    # Индикатор прореживания данных
+    if is_downsampled:
+        fig.add_annotation(
+            x=1, y=1.05,
+            xref="paper", yref="paper",
+            xanchor="right",
+            text=f"Показано {len(plot_df):,} из {len(filtered_df):,} точек (прореживание LTTB)".replace(",", " "),
+            showarrow=False,
+            font=dict(size=11, color="#7f8c8d")
+        )
+    
     return fig
 
-@callback(
+@year_slider_callback(
     Output("bubble-chart", "figure"),
     [Input("bubble-x-axis", "value"),
      Input("bubble-y-axis", "value"),
      Input("bubble-size", "value"),
-     Input("year-slider", "value")]
+     Input("year-slider", "value"),
+     Input("bubble-animate", "value")]
 )
-def update_bubble_chart(x_axis, y_axis, size, year):
+def update_bubble_chart(x_axis, y_axis, size, year, animate=None):
     """
     Обновляет пузырьковую диаграмму на основе выбранных параметров
     
@@ -557,12 +1613,36 @@ def update_bubble_chart(x_axis, y_axis, size, year):
         y_axis (str): Метрика для оси Y
         size (str): Метрика для размера пузырьков
         year (int): Выбранный год
+        animate (list): Значение переключателя анимации (["play"] — анимация по годам)
     
     Returns:
         dict: Объект figure для графика
     """
+    # Анимация по всем годам не зависит от положения слайдера: при его
+    # перемещении уже показанная анимация не пересобирается и не пересылается
+    if animate and "play" in animate:
+        if ctx.triggered_id == "year-slider":
+            return no_update
+        return build_bubble_animation(x_axis, y_axis, size)
+    
+    return build_bubble_chart(x_axis, y_axis, size, year)
+
+@cached_figure
+def build_bubble_chart(x_axis, y_axis, size, year):
+    """
+    Строит пузырьковую диаграмму за выбранный год
+    
+    Args:
+        x_axis (str): Метрика для оси X
+        y_axis (str): Метрика для оси Y
+        size (str): Метрика для размера пузырьков
+        year (int): Выбранный год
+    
+    Returns:
+        go.Figure: Пузырьковая диаграмма
+    """
     # Фильтрация данных по выбранному году
-    filtered_df = df[df["year"] == year]
+    filtered_df = figure_frame(get_year_data(year))
     
     # Используем логарифмический масштаб для больших значений
     use_log_x = x_axis in ["pop", "gdpPercap"]
@@ -589,7 +1669,8 @@ def update_bubble_chart(x_axis, y_axis, size, year):
         title=f"Сравнение стран по выбранным показателям в {year} году",
         color_discrete_sequence=COLOR_SCHEME["bubble"],
         template="plotly_white",
-        hover_data={"country": True, x_axis: True, y_axis: True, size: True}  # Добавляем дополнительные данные для всплывающих подсказок
+        hover_data={"country": True, x_axis: True, y_axis: True, size: True},  # Добавляем дополнительные данные для всплывающих подсказок
+        render_mode=render_mode_for(len(filtered_df))  # WebGL для больших наборов точек
     )
     
     # Настройка внешнего вида графика
@@ -614,10 +1695,11 @@ def update_bubble_chart(x_axis, y_axis, size, year):
     
     return fig
 
-@callback(
+@year_slider_callback(
     Output("top15-chart", "figure"),
     [Input("top15-year-slider", "value")]
 )
+@cached_figure
 def update_top15_chart(year):
     """
     Обновляет столбчатую диаграмму топ-15 стран по населению
@@ -628,11 +1710,8 @@ def update_top15_chart(year):
     Returns:
         dict: Объект figure для графика
     """
-    # Фильтрация данных по выбранному году
-    filtered_df = df[df["year"] == year]
-    
-    # Получение топ-15 стран по населению
-    top15 = filtered_df.sort_values("pop", ascending=False).head(15)
+    # Получение заранее вычисленного топ-15 стран по населению
+    top15 = get_aggregate("top15", year)
     
     # Создание столбчатой диаграммы
     fig = px.bar(
@@ -675,10 +1754,11 @@ def update_top15_chart(year):
     
     return fig
 
-@callback(
+@year_slider_callback(
     Output("continent-pie-chart", "figure"),
     [Input("pie-year-slider", "value")]
 )
+@cached_figure
 def update_pie_chart(year):
     """
     Обновляет круговую диаграмму распределения населения по континентам
@@ -689,15 +1769,9 @@ def update_pie_chart(year):
     Returns:
         dict: Объект figure для графика
     """
-    # Фильтрация данных по выбранному году
-    filtered_df = df[df["year"] == year]
-    
-    # Группировка данных по континентам и суммирование населения
-    continent_pop = filtered_df.groupby("continent")["pop"].sum().reset_index()
-    
-    # Добавляем процентный формат для лучшей наглядности
+    # Получение заранее вычисленного населения континентов с процентами
+    continent_pop = get_aggregate("continent_pop", year)
     total_pop = continent_pop["pop"].sum()
-    continent_pop["percentage"] = continent_pop["pop"].apply(lambda x: f"{x/total_pop:.1%}")
     
     # Создание круговой диаграммы
     fig = px.pie(
@@ -742,6 +1816,210 @@ def update_pie_chart(year):
     
     return fig
 
+# ---------------------------------- КЛИЕНТСКИЕ CALLBACK ФУНКЦИИ ----------------------------------
+
+# Пузырьковая диаграмма: группировка по континентам и размеры пузырьков как в px.scatter
+CLIENTSIDE_BUBBLE_JS = """
+function(xAxis, yAxis, size, year, payload) {
+    const data = payload && payload.bubble[year];
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+    const labels = payload.labels;
+    const colors = payload.colors.bubble;
+    // Максимум считается проходом по массиву: разворот в аргументы Math.max
+    // превышает предел числа аргументов на больших наборах данных
+    const maxSize = data[size].reduce((max, value) => value > max ? value : max, -Infinity);
+    const sizeref = maxSize / (50 * 50);
+    const traceType = data.continent.length > payload.webgl_threshold ? 'scattergl' : 'scatter';
+    const traces = {};
+    const order = [];
+
+    data.continent.forEach((code, i) => {
+        const continent = payload.continents[code];
+        if (!traces[continent]) {
+            traces[continent] = {
+                type: traceType, mode: 'markers', name: continent, legendgroup: continent,
+                showlegend: true, x: [], y: [], hovertext: [],
+                marker: {size: [], sizemode: 'area', sizeref: sizeref, opacity: 0.8,
+                         symbol: 'circle', color: colors[order.length % colors.length]},
+                hovertemplate: '<b>%{hovertext}</b><br><br>Континент=' + continent +
+                    '<br>' + labels[xAxis] + '=%{x}<br>' + labels[yAxis] + '=%{y}<br>' +
+                    labels[size] + '=%{marker.size}<extra></extra>'
+            };
+            order.push(continent);
+        }
+        const trace = traces[continent];
+        trace.x.push(data[xAxis][i]);
+        trace.y.push(data[yAxis][i]);
+        trace.marker.size.push(data[size][i]);
+        trace.hovertext.push(payload.countries[data.country[i]]);
+    });
+
+    const layout = JSON.parse(JSON.stringify(payload.layouts.bubble));
+    const logMetrics = ['pop', 'gdpPercap'];
+    layout.title.text = `Сравнение стран по выбранным показателям в ${year} году`;
+    layout.xaxis.title.text = labels[xAxis];
+    layout.xaxis.type = logMetrics.includes(xAxis) ? 'log' : 'linear';
+    layout.yaxis.title.text = labels[yAxis];
+    layout.yaxis.type = logMetrics.includes(yAxis) ? 'log' : 'linear';
+    layout.annotations[0].text = `Данные за ${year} год`;
+    return {data: order.map(continent => traces[continent]), layout: layout};
+}
+"""
+
+# Топ-15 стран: столбцы по континентам в порядке убывания населения
+CLIENTSIDE_TOP15_JS = """
+function(year, payload) {
+    const data = payload && payload.top15[year];
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+    const colors = payload.colors.bar;
+    const traces = {};
+    const order = [];
+
+    data.continent.forEach((code, i) => {
+        const continent = payload.continents[code];
+        if (!traces[continent]) {
+            traces[continent] = {
+                type: 'bar', name: continent, legendgroup: continent, showlegend: true,
+                x: [], y: [], text: [], marker: {color: colors[order.length % colors.length]},
+                texttemplate: '%{text:.3s}', textposition: 'outside',
+                hovertemplate: 'Континент=' + continent +
+                    '<br>Страна=%{x}<br>Население (человек)=%{y}<br>text=%{text}<extra></extra>'
+            };
+            order.push(continent);
+        }
+        const trace = traces[continent];
+        trace.x.push(payload.countries[data.country[i]]);
+        trace.y.push(data.pop[i]);
+        trace.text.push(String(data.pop[i]).replace(/\\B(?=(\\d{3})+(?!\\d))/g, ' '));
+    });
+
+    const layout = JSON.parse(JSON.stringify(payload.layouts.top15));
+    layout.title.text = `Топ-15 стран по населению в ${year} году`;
+    return {data: order.map(continent => traces[continent]), layout: layout};
+}
+"""
+
+# Круговая диаграмма: заранее вычисленные суммы населения по континентам
+CLIENTSIDE_PIE_JS = """
+function(year, payload) {
+    const data = payload && payload.pie[year];
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+    const total = data.pop.reduce((sum, value) => sum + value, 0);
+    const trace = {
+        type: 'pie', labels: data.continent, values: data.pop,
+        customdata: data.pop.map((value, i) => [value, data.percentage[i]]),
+        hovertemplate: 'Континент=%{label}<br>Население (человек)=%{value}' +
+            '<br>Процент=%{customdata[1]}<extra></extra>',
+        textinfo: 'percent+label', textposition: 'inside', textfont: {size: 12},
+        marker: {line: {color: 'white', width: 2}}, showlegend: true
+    };
+
+    const layout = JSON.parse(JSON.stringify(payload.layouts.pie));
+    layout.title.text = `Распределение населения по континентам в ${year} году`;
+    layout.annotations[0].text = 'Общее население: ' +
+        String(total).replace(/\\B(?=(\\d{3})+(?!\\d))/g, ' ');
+    return {data: [trace], layout: layout};
+}
+"""
+
+def compact_values(values):
+    """
+    Преобразует столбец в список для передачи в браузер
+    
+    Args:
+        values (np.ndarray): Значения столбца
+    
+    Returns:
+        list: Целые числа без изменений, дробные — округленные до 3 знаков
+    """
+    if np.issubdtype(values.dtype, np.integer):
+        return values.tolist()
+    return np.round(values.astype('float64'), 3).tolist()
+
+def build_year_payload():
+    """
+    Собирает компактные данные по всем годам для клиентских callback-функций
+    
+    Страны и континенты передаются кодами категорий, а оформление графиков —
+    один раз в виде базовых layout, построенных серверными функциями.
+    
+    Returns:
+        dict: Данные по годам для пузырьковой диаграммы, топ-15 и круговой диаграммы
+    """
+    country_codes = df['country'].cat.codes.to_numpy()
+    continent_codes = df['continent'].cat.codes.to_numpy()
+    continents = df['continent'].cat.categories
+    
+    bubble, top15, pie = {}, {}, {}
+    for year, rows in year_index.items():
+        bubble[year] = {
+            'country': country_codes[rows].tolist(),
+            'continent': continent_codes[rows].tolist(),
+            **{metric: compact_values(df[metric].to_numpy()[rows]) for metric in METRIC_LABELS}
+        }
+        
+        year_top15 = get_aggregate("top15", year)
+        top15[year] = {
+            'country': year_top15['country'].cat.codes.tolist(),
+            'continent': year_top15['continent'].cat.codes.tolist(),
+            'pop': year_top15['pop'].tolist()
+        }
+        
+        year_pie = get_aggregate("continent_pop", year)
+        pie[year] = {
+            'continent': year_pie['continent'].astype(str).tolist(),
+            'pop': year_pie['pop'].tolist(),
+            'percentage': year_pie['percentage'].tolist()
+        }
+    
+    default_year = max(years)
+    return {
+        'countries': df['country'].cat.categories.tolist(),
+        'continents': continents.tolist(),
+        'labels': METRIC_LABELS,
+        'webgl_threshold': WEBGL_POINT_THRESHOLD,
+        'colors': {'bubble': COLOR_SCHEME['bubble'], 'bar': COLOR_SCHEME['bar']},
+        'layouts': {
+            'bubble': go.Figure(update_bubble_chart("gdpPercap", "lifeExp", "pop", default_year)).to_plotly_json()['layout'],
+            'top15': go.Figure(update_top15_chart(default_year)).to_plotly_json()['layout'],
+            'pie': go.Figure(update_pie_chart(default_year)).to_plotly_json()['layout']
+        },
+        'bubble': bubble,
+        'top15': top15,
+        'pie': pie
+    }
+
+if CLIENTSIDE_SLIDERS:
+    year_payload_store.data = build_year_payload()
+    
+    app.clientside_callback(
+        CLIENTSIDE_BUBBLE_JS,
+        Output("bubble-chart", "figure"),
+        [Input("bubble-x-axis", "value"),
+         Input("bubble-y-axis", "value"),
+         Input("bubble-size", "value"),
+         Input("year-slider", "value"),
+         Input("year-payload", "data")]
+    )
+    app.clientside_callback(
+        CLIENTSIDE_TOP15_JS,
+        Output("top15-chart", "figure"),
+        [Input("top15-year-slider", "value"),
+         Input("year-payload", "data")]
+    )
+    app.clientside_callback(
+        CLIENTSIDE_PIE_JS,
+        Output("continent-pie-chart", "figure"),
+        [Input("pie-year-slider", "value"),
+         Input("year-payload", "data")]
+    )
+
 # ---------------------------------- ЗАПУСК ПРИЛОЖЕНИЯ ----------------------------------
 
 if __name__ == "__main__":
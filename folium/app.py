@@ -1,15 +1,53 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 import folium
 from folium.plugins import MarkerCluster, Search, Fullscreen, MeasureControl, LocateControl, MiniMap, Draw
+from branca.element import CssLink, MacroElement
+from jinja2 import Template
 import os
 import json
+import gzip
+import hashlib
+import sys
+import textwrap
+from html import escape
+import asyncio
+import heapq
+import math
+import re
+import threading
+import urllib.error
+import urllib.request
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import xyzservices.providers as xyz
+except ImportError:
+    xyz = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запускает наблюдение за файлом данных на время работы приложения"""
+    watcher = asyncio.create_task(watch_campus_data()) if DATA_CHECK_INTERVAL > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+
+
 # Создаем FastAPI приложение
-app = FastAPI(title="ИГУ Карта Корпусов")
+app = FastAPI(title="ИГУ Карта Корпусов", lifespan=lifespan)
 
 # Настраиваем шаблоны и статические файлы
 templates_dir = "templates"
@@ -18,282 +56,19 @@ templates = Jinja2Templates(directory=templates_dir)
 
 static_dir = "static"
 os.makedirs(static_dir, exist_ok=True)
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-
-# Данные о корпусах ИГУ
-campus_data = [
-    {
-        "id": 1,
-        "name": "Главный корпус ИГУ",
-        "address": "ул. Карла Маркса, 1, Иркутск",
-        "lat": 52.2851,
-        "lon": 104.2813,
-        "category": "администрация",
-        "description": "Главный административный корпус Иркутского государственного университета",
-        "year_built": 1931,
-        "floors": 4,
-        "students_capacity": 500,
-        "phone": "+7 (3952) 24-34-53",
-        "website": "https://isu.ru",
-        "faculties": ["Ректорат", "Приемная комиссия"]
-    },
-    {
-        "id": 2,
-        "name": "Исторический факультет",
-        "address": "ул. Чкалова, 2, Иркутск",
-        "lat": 52.2842,
-        "lon": 104.2855,
-        "category": "учебное",
-        "description": "Корпус исторического факультета ИГУ",
-        "year_built": 1940,
-        "floors": 3,
-        "students_capacity": 800,
-        "phone": "+7 (3952) 24-37-25",
-        "website": "https://hist.isu.ru",
-        "faculties": ["Исторический факультет", "Факультет психологии"]
-    },
-    {
-        "id": 3,
-        "name": "Биолого-почвенный факультет",
-        "address": "ул. Сухэ-Батора, 5, Иркутск",
-        "lat": 52.2867,
-        "lon": 104.2826,
-        "category": "учебное",
-        "description": "Корпус биолого-почвенного факультета ИГУ",
-        "year_built": 1960,
-        "floors": 4,
-        "students_capacity": 600,
-        "phone": "+7 (3952) 24-18-55",
-        "website": "https://bio.isu.ru",
-        "faculties": ["Биолого-почвенный факультет"]
-    },
-    {
-        "id": 4,
-        "name": "Физический факультет",
-        "address": "бульвар Гагарина, 20, Иркутск",
-        "lat": 52.2731,
-        "lon": 104.2767,
-        "category": "учебное",
-        "description": "Корпус физического факультета ИГУ",
-        "year_built": 1965,
-        "floors": 5,
-        "students_capacity": 750,
-        "phone": "+7 (3952) 52-12-70",
-        "website": "https://physdep.isu.ru",
-        "faculties": ["Физический факультет"]
-    },
-    {
-        "id": 5,
-        "name": "Химический факультет",
-        "address": "ул. Лермонтова, 126, Иркутск",
-        "lat": 52.2501,
-        "lon": 104.2591,
-        "category": "учебное",
-        "description": "Корпус химического факультета ИГУ",
-        "year_built": 1975,
-        "floors": 6,
-        "students_capacity": 700,
-        "phone": "+7 (3952) 42-59-51",
-        "website": "https://chem.isu.ru",
-        "faculties": ["Химический факультет"]
-    },
-    {
-        "id": 6,
-        "name": "Факультет психологии",
-        "address": "ул. Чкалова, 2, Иркутск",
-        "lat": 52.2845,
-        "lon": 104.2858,
-        "category": "учебное",
-        "description": "Корпус факультета психологии ИГУ",
-        "year_built": 1940,
-        "floors": 3,
-        "students_capacity": 400,
-        "phone": "+7 (3952) 24-39-95",
-        "website": "https://psycho.isu.ru",
-        "faculties": ["Факультет психологии"]
-    },
-    {
-        "id": 7,
-        "name": "Юридический институт",
-        "address": "ул. Улан-Баторская, 10, Иркутск",
-        "lat": 52.2611,
-        "lon": 104.3020,
-        "category": "учебное",
-        "description": "Юридический институт ИГУ",
-        "year_built": 1998,
-        "floors": 5,
-        "students_capacity": 1200,
-        "phone": "+7 (3952) 52-11-91",
-        "website": "https://lawinst.isu.ru",
-        "faculties": ["Юридический институт"]
-    },
-    {
-        "id": 8,
-        "name": "Международный институт экономики и лингвистики",
-        "address": "ул. Ленина, 8, Иркутск",
-        "lat": 52.2889,
-        "lon": 104.2836,
-        "category": "учебное",
-        "description": "Международный институт экономики и лингвистики ИГУ",
-        "year_built": 1988,
-        "floors": 4,
-        "students_capacity": 900,
-        "phone": "+7 (3952) 24-68-39",
-        "website": "https://miel.isu.ru",
-        "faculties": ["Институт экономики и лингвистики"]
-    },
-    {
-        "id": 9,
-        "name": "Институт математики, экономики и информатики",
-        "address": "бульвар Гагарина, 20, Иркутск",
-        "lat": 52.2735,
-        "lon": 104.2773,
-        "category": "учебное",
-        "description": "Институт математики, экономики и информатики ИГУ",
-        "year_built": 1965,
-        "floors": 5,
-        "students_capacity": 1000,
-        "phone": "+7 (3952) 52-12-77",
-        "website": "https://math.isu.ru",
-        "faculties": ["Институт математики, экономики и информатики"]
-    },
-    {
-        "id": 10,
-        "name": "Педагогический институт",
-        "address": "ул. Нижняя Набережная, 6, Иркутск",
-        "lat": 52.2905,
-        "lon": 104.2796,
-        "category": "учебное",
-        "description": "Педагогический институт ИГУ",
-        "year_built": 1955,
-        "floors": 4,
-        "students_capacity": 1500,
-        "phone": "+7 (3952) 20-07-20",
-        "website": "https://pi.isu.ru",
-        "faculties": ["Педагогический институт"]
-    },
-    {
-        "id": 11,
-        "name": "Общежитие №1",
-        "address": "ул. Улан-Баторская, 2, Иркутск",
-        "lat": 52.2606,
-        "lon": 104.3005,
-        "category": "общежитие",
-        "description": "Общежитие №1 ИГУ",
-        "year_built": 1980,
-        "floors": 9,
-        "students_capacity": 450,
-        "phone": "+7 (3952) 52-15-44",
-        "website": "https://isu.ru/hostel",
-        "facilities": ["Прачечная", "Спортзал", "Читальный зал"]
-    },
-    {
-        "id": 12,
-        "name": "Общежитие №2",
-        "address": "ул. Улан-Баторская, 4, Иркутск",
-        "lat": 52.2608,
-        "lon": 104.3010,
-        "category": "общежитие",
-        "description": "Общежитие №2 ИГУ",
-        "year_built": 1982,
-        "floors": 9,
-        "students_capacity": 500,
-        "phone": "+7 (3952) 52-15-46",
-        "website": "https://isu.ru/hostel",
-        "facilities": ["Прачечная", "Кафе", "Читальный зал"]
-    },
-    {
-        "id": 13,
-        "name": "Научная библиотека",
-        "address": "бульвар Гагарина, 24, Иркутск",
-        "lat": 52.2722,
-        "lon": 104.2761,
-        "category": "библиотека",
-        "description": "Научная библиотека ИГУ",
-        "year_built": 1970,
-        "floors": 3,
-        "capacity": 300,
-        "book_count": 1500000,
-        "phone": "+7 (3952) 24-29-74",
-        "website": "https://library.isu.ru",
-        "services": ["Абонемент", "Читальный зал", "Электронные ресурсы"]
-    },
-    {
-        "id": 14,
-        "name": "Спортивный комплекс",
-        "address": "ул. Ленина, 3, Иркутск",
-        "lat": 52.2893,
-        "lon": 104.2823,
-        "category": "спорт",
-        "description": "Спортивный комплекс ИГУ",
-        "year_built": 1972,
-        "floors": 2,
-        "capacity": 500,
-        "phone": "+7 (3952) 24-63-62",
-        "website": "https://sport.isu.ru",
-        "facilities": ["Большой зал", "Тренажерный зал", "Бассейн", "Тир"]
-    },
-    {
-        "id": 15,
-        "name": "Общежитие №3",
-        "address": "ул. Улан-Баторская, 6, Иркутск",
-        "lat": 52.2610,
-        "lon": 104.3015,
-        "category": "общежитие",
-        "description": "Общежитие №3 ИГУ",
-        "year_built": 1985,
-        "floors": 9,
-        "students_capacity": 480,
-        "phone": "+7 (3952) 52-15-48",
-        "website": "https://isu.ru/hostel",
-        "facilities": ["Прачечная", "Комната отдыха", "Учебная комната"]
-    },
-    {
-        "id": 16,
-        "name": "Культурно-досуговый центр",
-        "address": "ул. Карла Маркса, 3, Иркутск",
-        "lat": 52.2855,
-        "lon": 104.2820,
-        "category": "культура",
-        "description": "Культурно-досуговый центр ИГУ",
-        "year_built": 1995,
-        "floors": 2,
-        "capacity": 300,
-        "phone": "+7 (3952) 24-35-90",
-        "website": "https://culture.isu.ru",
-        "facilities": ["Актовый зал", "Танцевальные студии", "Музей"]
-    },
-    {
-        "id": 17,
-        "name": "Столовая ИГУ",
-        "address": "ул. Карла Маркса, 2, Иркутск",
-        "lat": 52.2853,
-        "lon": 104.2817,
-        "category": "питание",
-        "description": "Главная столовая ИГУ",
-        "year_built": 1960,
-        "floors": 1,
-        "capacity": 200,
-        "phone": "+7 (3952) 24-36-50",
-        "website": "https://isu.ru/dining",
-        "meal_times": {"Завтрак": "8:00-10:00", "Обед": "12:00-15:00", "Ужин": "17:00-19:00"}
-    },
-    {
-        "id": 18,
-        "name": "Медицинский пункт",
-        "address": "ул. Карла Маркса, 1, Иркутск",
-        "lat": 52.2850,
-        "lon": 104.2814,
-        "category": "медицина",
-        "description": "Медицинский пункт ИГУ",
-        "year_built": 1970,
-        "floors": 1,
-        "capacity": 50,
-        "phone": "+7 (3952) 24-34-70",
-        "website": "https://health.isu.ru",
-        "services": ["Первая помощь", "Профосмотры", "Вакцинация"]
-    }
-]
+
+
+class CachedStaticFiles(StaticFiles):
+    """Статические файлы с долгосрочным кэшированием для адресов с отпечатком версии (?v=)"""
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200 and b"v=" in scope.get("query_string", b""):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+app.mount("/static", CachedStaticFiles(directory=static_dir), name="static")
 
 # Определение категорий и иконок для них
 category_icons = {
@@ -319,6 +94,360 @@ category_colors = {
     "медицина": "darkred"
 }
 
+# Данные о корпусах ИГУ хранятся во внешнем файле и перечитываются при его изменении
+data_dir = "data"
+CAMPUS_DATA_PATH = os.environ.get("ISU_MAP_DATA_PATH", os.path.join(data_dir, "campuses.json"))
+
+# Интервал проверки файла данных на изменения в секундах (0 — не проверять)
+DATA_CHECK_INTERVAL = float(os.environ.get("ISU_MAP_DATA_CHECK_INTERVAL", "2"))
+
+# Поля, без которых запись о корпусе не может быть показана на карте
+CAMPUS_REQUIRED_FIELDS = ("id", "name", "address", "lat", "lon", "category")
+
+# Предельная широта веб-меркатора: точки за ней нельзя показать на карте и разложить по тайлам
+MERCATOR_MAX_LAT = 85.05112878
+
+
+def is_number(value) -> bool:
+    """Проверяет, что значение — конечное число (bool числом не считается)"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def is_count(value) -> bool:
+    """Проверяет, что значение — неотрицательное целое число"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def is_text(value) -> bool:
+    """Проверяет, что значение — строка"""
+    return isinstance(value, str)
+
+
+def is_text_list(value) -> bool:
+    """Проверяет, что значение — список строк"""
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def is_text_map(value) -> bool:
+    """Проверяет, что значение — объект со строковыми значениями"""
+    return isinstance(value, dict) and all(isinstance(item, str) for item in value.values())
+
+
+# Проверки типов полей записи о корпусе (id и координаты проверяются отдельно)
+CAMPUS_FIELD_TYPES = {
+    "name": (is_text, "строка"),
+    "address": (is_text, "строка"),
+    "category": (is_text, "строка"),
+    "description": (is_text, "строка"),
+    "phone": (is_text, "строка"),
+    "website": (is_text, "строка"),
+    "year_built": (is_count, "неотрицательное целое"),
+    "floors": (is_count, "неотрицательное целое"),
+    "students_capacity": (is_count, "неотрицательное целое"),
+    "capacity": (is_count, "неотрицательное целое"),
+    "book_count": (is_count, "неотрицательное целое"),
+    "faculties": (is_text_list, "список строк"),
+    "services": (is_text_list, "список строк"),
+    "facilities": (is_text_list, "список строк"),
+    "meal_times": (is_text_map, "объект со строковыми значениями")
+}
+
+
+def load_campus_file(path: str) -> List[Dict[str, Any]]:
+    """
+    Читает данные о корпусах из JSON-файла и проверяет их
+
+    Args:
+        path (str): Путь к JSON-файлу со списком корпусов
+
+    Returns:
+        list: Записи о корпусах
+
+    Raises:
+        ValueError: Если файл не содержит список, у записи нет обязательных полей,
+            id не положительное целое, координаты не числа или вне допустимого
+            диапазона, у поля неверный тип (см. CAMPUS_FIELD_TYPES), категория
+            неизвестна или id повторяются
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: ожидается список корпусов")
+
+    ids = set()
+    for campus in data:
+        if not isinstance(campus, dict):
+            raise ValueError(f"{path}: запись о корпусе должна быть объектом")
+        missing = [field for field in CAMPUS_REQUIRED_FIELDS if field not in campus]
+        if missing:
+            raise ValueError(f"Корпус {campus.get('id')}: нет полей {', '.join(missing)}")
+        if not isinstance(campus["id"], int) or isinstance(campus["id"], bool) or campus["id"] <= 0:
+            raise ValueError(f"Корпус {campus['id']!r}: id должен быть положительным целым числом")
+        if not is_number(campus["lat"]) or abs(campus["lat"]) > MERCATOR_MAX_LAT:
+            raise ValueError(f"Корпус {campus['id']}: некорректная широта {campus['lat']!r}")
+        if not is_number(campus["lon"]) or abs(campus["lon"]) > 180:
+            raise ValueError(f"Корпус {campus['id']}: некорректная долгота {campus['lon']!r}")
+        for field, (check, expected) in CAMPUS_FIELD_TYPES.items():
+            if field in campus and not check(campus[field]):
+                raise ValueError(f"Корпус {campus['id']}: поле {field} должно быть типа «{expected}»")
+        if campus["category"] not in category_colors:
+            raise ValueError(f"Корпус {campus['id']}: неизвестная категория {campus['category']}")
+        if campus["id"] in ids:
+            raise ValueError(f"Повторяющийся id корпуса: {campus['id']}")
+        ids.add(campus["id"])
+
+    return data
+
+
+def data_file_stamp(path: str):
+    """Возвращает отметку изменения файла (время изменения и размер)"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+campus_data = load_campus_file(CAMPUS_DATA_PATH)
+# "stamp" — отметка загруженного файла, "failed" — отметка файла, который прочитать не удалось
+data_file_state = {"stamp": data_file_stamp(CAMPUS_DATA_PATH), "failed": None}
+
+
+# Кластеризация маркеров на сервере: на малых масштабах браузер получает только
+# центры кластеров и их размеры (/clusters/{z}/{x}/{y}); включает ленивую загрузку
+SERVER_CLUSTERS = os.environ.get("ISU_MAP_SERVER_CLUSTERS", "0") == "1"
+
+# Ленивая загрузка маркеров: страница содержит пустой слой, а маркеры видимой
+# области браузер запрашивает по тайлам (/markers/{z}/{x}/{y})
+LAZY_MARKERS = os.environ.get("ISU_MAP_LAZY_MARKERS", "0") == "1" or SERVER_CLUSTERS
+
+# Максимальный масштаб тайлов, которыми браузер запрашивает маркеры
+LAZY_TILE_MAX_ZOOM = int(os.environ.get("ISU_MAP_LAZY_TILE_ZOOM", "14"))
+
+# Параметры серверной кластеризации: радиус кластера в пикселях, размер тайла
+# и максимальный масштаб, на котором точки еще объединяются
+CLUSTER_RADIUS_PX = int(os.environ.get("ISU_MAP_CLUSTER_RADIUS", "60"))
+CLUSTER_EXTENT_PX = 256
+CLUSTER_MAX_ZOOM = int(os.environ.get("ISU_MAP_CLUSTER_MAX_ZOOM", "16"))
+
+# Пул потоков для отрисовки карт и экспорта, чтобы не блокировать цикл событий
+RENDER_WORKERS = int(os.environ.get("ISU_MAP_RENDER_WORKERS", "2"))
+
+# Максимальное число задач, ожидающих свободного потока (сверх него — ответ 503)
+RENDER_QUEUE_LIMIT = int(os.environ.get("ISU_MAP_RENDER_QUEUE_LIMIT", "32"))
+
+render_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="map-render")
+
+# Метрики пула отрисовки
+render_stats = {"queued": 0, "active": 0, "completed": 0, "failed": 0, "rejected": 0}
+render_stats_lock = threading.Lock()
+
+
+def submit_render(func, *args):
+    """
+    Ставит блокирующую функцию в очередь пула отрисовки с ограничением длины очереди
+
+    Returns:
+        concurrent.futures.Future: Результат выполнения функции
+
+    Raises:
+        HTTPException: 503, если очередь пула заполнена
+    """
+    with render_stats_lock:
+        if render_stats["queued"] + render_stats["active"] >= RENDER_WORKERS + RENDER_QUEUE_LIMIT:
+            render_stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Сервер перегружен, повторите запрос позже",
+                headers={"Retry-After": "1"}
+            )
+        render_stats["queued"] += 1
+
+    def task():
+        with render_stats_lock:
+            render_stats["queued"] -= 1
+            render_stats["active"] += 1
+        outcome = "failed"
+        try:
+            result = func(*args)
+            outcome = "completed"
+            return result
+        finally:
+            with render_stats_lock:
+                render_stats["active"] -= 1
+                render_stats[outcome] += 1
+
+    return render_executor.submit(task)
+
+
+async def run_in_render_pool(func, *args):
+    """Выполняет блокирующую функцию в пуле отрисовки, не блокируя цикл событий"""
+    return await asyncio.wrap_future(submit_render(func, *args))
+
+
+# Версия данных о корпусах (входит в ключ кэша отрисованных карт)
+def compute_data_version(data):
+    """Вычисляет хэш содержимого данных о корпусах"""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+data_version = compute_data_version(campus_data)
+
+# Данные и их версия заменяются вместе под этой блокировкой; потоки пула отрисовки
+# читают их через dataset_snapshot(), чтобы не увидеть новые данные со старой версией
+dataset_lock = threading.Lock()
+
+
+def dataset_snapshot():
+    """Возвращает согласованную пару (версия данных, список корпусов)"""
+    with dataset_lock:
+        return data_version, campus_data
+
+
+# Кэш отрисованных карт: {(версия данных, категории, ...): HTML-код карты}
+map_cache: Dict[Any, Dict[str, str]] = {}
+map_cache_lock = threading.Lock()
+
+# Отрисовки карт, выполняющиеся в пуле потоков: {ключ кэша: concurrent.futures.Future}
+pending_renders: Dict[Any, Future] = {}
+pending_renders_lock = threading.Lock()
+
+
+def map_cache_key(filter_categories=None, version=None):
+    """
+    Формирует ключ кэша карт из версии данных и набора категорий
+
+    Неизвестные категории отбрасываются, чтобы произвольные значения из запроса
+    не порождали новых записей в кэшах.
+    """
+    version = data_version if version is None else version
+    if filter_categories is None:
+        return version, frozenset(category_colors)
+    return version, frozenset(category_colors).intersection(filter_categories)
+
+
+def get_rendered_map(filter_categories=None, lazy=None, standalone=False):
+    """
+    Возвращает HTML-код карты из кэша, отрисовывая ее только при первом обращении
+
+    Args:
+        filter_categories (list): Список категорий для отображения
+        lazy (bool): Ленивая загрузка маркеров (по умолчанию — LAZY_MARKERS)
+        standalone (bool): Карта для автономной страницы — подложка грузится напрямую с серверов тайлов
+
+    Returns:
+        dict: Части карты для шаблона (см. create_map)
+    """
+    lazy = LAZY_MARKERS if lazy is None else lazy
+    proxy_tiles = TILE_PROXY and not standalone
+    version, campuses = dataset_snapshot()
+    key = (*map_cache_key(filter_categories, version), lazy, proxy_tiles)
+
+    folium_map = map_cache.get(key)
+    if folium_map is None:
+        folium_map = create_map(sorted(key[1]), lazy=lazy, campuses=campuses, proxy_tiles=proxy_tiles)
+        with map_cache_lock:
+            # Записи для устаревших версий данных больше не понадобятся
+            for stale_key in [k for k in map_cache if k[0] != key[0]]:
+                map_cache.pop(stale_key, None)
+            map_cache[key] = folium_map
+
+    return folium_map
+
+
+async def get_rendered_map_async(filter_categories=None, lazy=None, standalone=False):
+    """
+    Асинхронно возвращает HTML-код карты, отрисовывая ее в пуле потоков
+
+    Одновременные запросы одной и той же карты ожидают одну общую отрисовку.
+
+    Args:
+        filter_categories (list): Список категорий для отображения
+        lazy (bool): Ленивая загрузка маркеров (по умолчанию — LAZY_MARKERS)
+        standalone (bool): Карта для автономной страницы (см. get_rendered_map)
+
+    Returns:
+        dict: Части карты для шаблона (см. create_map)
+    """
+    lazy = LAZY_MARKERS if lazy is None else lazy
+    key = (*map_cache_key(filter_categories), lazy, TILE_PROXY and not standalone)
+    folium_map = map_cache.get(key)
+    if folium_map is not None:
+        return folium_map
+
+    with pending_renders_lock:
+        future = pending_renders.get(key)
+        if future is None:
+            future = submit_render(get_rendered_map, sorted(key[1]), lazy, standalone)
+            pending_renders[key] = future
+            future.add_done_callback(lambda _: pending_renders.pop(key, None))
+
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+
+def compute_etag(body: bytes) -> str:
+    """Вычисляет ETag для тела ответа"""
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Проверяет, совпадает ли ETag с одним из значений заголовка If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in [value[2:] if value.startswith("W/") else value for value in candidates]
+
+
+# Хэши содержимого сгенерированных файлов: {путь: хэш}
+asset_hashes: Dict[str, str] = {}
+
+# Содержимое сгенерированных файлов (для встраивания в /export без чтения с диска): {путь: текст}
+asset_contents: Dict[str, str] = {}
+
+
+def write_static_file(path: str, content: str) -> str:
+    """
+    Записывает сгенерированный файл, только если его содержимое изменилось
+
+    Запись выполняется через временный файл с атомарной заменой, поэтому
+    параллельные процессы не видят частично записанный файл.
+
+    Returns:
+        str: Короткий хэш содержимого файла
+    """
+    data = content.encode("utf-8")
+    content_hash = hashlib.sha256(data).hexdigest()[:12]
+
+    try:
+        with open(path, "rb") as f:
+            unchanged = hashlib.sha256(f.read()).hexdigest()[:12] == content_hash
+    except OSError:
+        unchanged = False
+
+    if not unchanged:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    asset_hashes[os.path.normpath(path)] = content_hash
+    asset_contents[os.path.normpath(path)] = content
+    return content_hash
+
+
+def asset_url(name: str) -> str:
+    """Возвращает адрес статического файла с отпечатком версии содержимого"""
+    content_hash = asset_hashes.get(os.path.normpath(os.path.join(static_dir, name)))
+    return f"/static/{name}?v={content_hash}" if content_hash else f"/static/{name}"
+
+
+def build_static_assets():
+    """Генерирует статические файлы и шаблон (неизмененные файлы не перезаписываются)"""
+    create_icon_files()
+    create_css_files()
+    create_js_files()
+    create_html_template()
+
 
 # Создаем иконки для каждой категории
 def create_icon_files():
@@ -405,6 +534,33 @@ def create_css_files():
     .dark-theme .dropdown-item:hover {
         background-color: #333;
     }
+
+    .dark-theme .info-panel {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+        border-color: #333;
+    }
+
+    .dark-theme .toggle-sidebar {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+    }
+
+    .dark-theme input[type="text"] {
+        background-color: #333;
+        color: #e0e0e0;
+        border-color: #444;
+    }
+
+    .dark-theme .leaflet-container {
+        background-color: #333;
+    }
+
+    .dark-theme .leaflet-popup-content-wrapper,
+    .dark-theme .leaflet-popup-tip {
+        background-color: #1e1e1e;
+        color: #e0e0e0;
+    }
     """
 
     # Основной CSS
@@ -607,12 +763,9 @@ def create_css_files():
     }
     """
 
-    # Записываем CSS файлы
-    with open(os.path.join(css_dir, "dark-theme.css"), 'w') as f:
-        f.write(dark_css)
-
-    with open(os.path.join(css_dir, "style.css"), 'w') as f:
-        f.write(main_css)
+    # Записываем CSS файлы (только при изменении содержимого)
+    write_static_file(os.path.join(css_dir, "dark-theme.css"), textwrap.dedent(dark_css).lstrip("\n"))
+    write_static_file(os.path.join(css_dir, "style.css"), textwrap.dedent(main_css).lstrip("\n"))
 
 
 # Создаем JavaScript файл для интерактивных функций
@@ -653,24 +806,70 @@ def create_js_files():
             this.textContent = sidebar.classList.contains('hide-sidebar') ? '>' : '<';
         });
 
-        // Фильтрация категорий
+        // Фильтрация категорий: сервер возвращает GeoJSON, обновляется только слой маркеров
         const categoryFilters = document.querySelectorAll('.category-filter');
+        const filterCache = new Map();
+        let filterController = null;
+
+        function applyCategoryFilter() {
+            // В ленивом режиме маркеры уже загружены по тайлам — фильтруем их в браузере
+            if (['lazy', 'clustered'].includes(window.campusMarkerMode)) {
+                renderViewportMarkers();
+                return;
+            }
+
+            const params = new URLSearchParams();
+            categoryFilters.forEach(filter => {
+                if (filter.checked) {
+                    params.append('category', filter.value);
+                }
+            });
+            const query = params.toString();
+
+            // Отменяем запрос, ответ на который уже не нужен
+            if (filterController) {
+                filterController.abort();
+                filterController = null;
+            }
+
+            if (filterCache.has(query)) {
+                renderMarkers(filterCache.get(query));
+                return;
+            }
+
+            filterController = new AbortController();
+            fetch(`/filter?${query}`, {signal: filterController.signal})
+                .then(checkDataVersion)
+                .then(response => response.json())
+                .then(data => {
+                    filterCache.set(query, data);
+                    renderMarkers(data);
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Ошибка фильтрации:', error);
+                    }
+                });
+        }
 
         categoryFilters.forEach(filter => {
-            filter.addEventListener('change', function() {
-                const category = this.value;
-                const isChecked = this.checked;
+            filter.addEventListener('change', applyCategoryFilter);
+        });
 
-                // Отправляем запрос на сервер для фильтрации
-                fetch(`/filter?category=${category}&show=${isChecked}`)
-                    .then(response => response.json())
-                    .then(data => {
-                        // Здесь должен быть код для обновления маркеров на карте
-                        console.log(`Category ${category} is now ${isChecked ? 'visible' : 'hidden'}`);
-                    });
-            });
+        // После обновления данных на сервере загруженные слои маркеров устарели
+        onDataVersionChange(() => {
+            filterCache.clear();
+            if (!['lazy', 'clustered'].includes(window.campusMarkerMode)) {
+                applyCategoryFilter();
+            }
         });
 
+        // Ленивая загрузка маркеров (или кластеров с сервера) видимой области
+        if (['lazy', 'clustered'].includes(window.campusMarkerMode) && window.leafletMap) {
+            window.leafletMap.on('moveend', loadViewportMarkers);
+            loadViewportMarkers();
+        }
+
         // Поиск корпусов
         const searchInput = document.getElementById('search-input');
         const searchButton = document.getElementById('search-button');
@@ -679,14 +878,79 @@ def create_js_files():
             const searchTerm = searchInput.value.trim();
             if (searchTerm) {
                 fetch(`/search?term=${encodeURIComponent(searchTerm)}`)
+                    .then(checkDataVersion)
                     .then(response => response.json())
                     .then(data => {
-                        // Код для выделения найденных корпусов
-                        console.log(`Search results for "${searchTerm}":`, data);
+                        // Если есть результаты поиска
+                        if (data.results && data.results.length > 0) {
+                            // Центрируем карту на первом результате
+                            const firstResult = data.results[0];
+                            const map = window.leafletMap;
+                            if (map) {
+                                map.setView([firstResult.lat, firstResult.lon], 17);
+
+                                // Показываем информационную панель
+                                showDetails(firstResult.id);
+                            }
+                        } else {
+                            alert('Ничего не найдено');
+                        }
                     });
             }
         });
 
+        // Подсказки при вводе: запросы откладываются до паузы в наборе и кэшируются
+        const suggestionList = document.getElementById('search-suggestions');
+        const suggestionCache = new Map();
+        let suggestTimer = null;
+        let suggestController = null;
+        onDataVersionChange(() => suggestionCache.clear());
+
+        function showSuggestions(suggestions) {
+            suggestionList.innerHTML = '';
+            suggestions.forEach(suggestion => {
+                const option = document.createElement('option');
+                option.value = suggestion.text;
+                suggestionList.appendChild(option);
+            });
+        }
+
+        searchInput.addEventListener('input', function() {
+            const prefix = this.value.trim().toLowerCase();
+            clearTimeout(suggestTimer);
+
+            if (prefix.length < 2) {
+                showSuggestions([]);
+                return;
+            }
+            if (suggestionCache.has(prefix)) {
+                showSuggestions(suggestionCache.get(prefix));
+                return;
+            }
+
+            suggestTimer = setTimeout(() => {
+                if (suggestController) {
+                    suggestController.abort();
+                }
+                suggestController = new AbortController();
+
+                fetch(`/suggest?prefix=${encodeURIComponent(prefix)}&k=8`, {signal: suggestController.signal})
+                    .then(checkDataVersion)
+                    .then(response => response.json())
+                    .then(data => {
+                        suggestionCache.set(prefix, data.suggestions);
+                        if (searchInput.value.trim().toLowerCase() === prefix) {
+                            showSuggestions(data.suggestions);
+                        }
+                    })
+                    .catch(error => {
+                        if (error.name !== 'AbortError') {
+                            console.error('Ошибка загрузки подсказок:', error);
+                        }
+                    });
+            }, 200);
+        });
+
         // Обработка нажатия Enter в поле поиска
         searchInput.addEventListener('keyup', function(event) {
             if (event.key === "Enter") {
@@ -704,11 +968,216 @@ def create_js_files():
             });
         }
     });
+
+    // Создает маркер Leaflet для объекта GeoJSON
+    function createMarker(feature) {
+        const [lon, lat] = feature.geometry.coordinates;
+        const props = feature.properties;
+        const icon = L.AwesomeMarkers.icon({
+            icon: 'info-sign',
+            iconColor: 'white',
+            markerColor: props.color,
+            prefix: 'glyphicon'
+        });
+
+        // Leaflet выводит строку подсказки как HTML, поэтому название передается текстовым узлом
+        const tooltip = document.createElement('span');
+        tooltip.textContent = props.name;
+
+        return L.marker([lat, lon], {icon: icon})
+            .bindPopup(props.popup, {maxWidth: 300})
+            .bindTooltip(tooltip);
+    }
+
+    // Создает значок кластера, пришедшего с сервера; щелчок приближает карту до его распада
+    function createClusterMarker(feature, count) {
+        const [lon, lat] = feature.geometry.coordinates;
+        const size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+        const icon = L.divIcon({
+            html: `<div><span>${count}</span></div>`,
+            className: `marker-cluster marker-cluster-${size}`,
+            iconSize: L.point(40, 40)
+        });
+
+        return L.marker([lat, lon], {icon: icon}).on('click', () => {
+            window.leafletMap.setView([lat, lon], feature.properties.expansion_zoom);
+        });
+    }
+
+    // Заменяет маркеры в слое кластеризации объектами из GeoJSON
+    function renderMarkers(geojson) {
+        const layer = window.campusMarkerLayer;
+        if (!layer) {
+            return;
+        }
+
+        layer.clearLayers();
+        layer.addLayers(geojson.features.map(createMarker));
+    }
+
+    // Кэш загруженных тайлов маркеров (ключ "z/x/y", порядок вставки — порядок использования)
+    const TILE_CACHE_LIMIT = 256;
+    const markerTileCache = new Map();
+    const markerById = new Map();
+    let viewportRequest = 0;
+
+    // Версия данных о корпусах, для которой заполнены кэши страницы; сервер
+    // сообщает текущую версию в заголовке X-Data-Version каждого ответа
+    let campusDataVersion = document.querySelector('meta[name="campus-data-version"]')?.content || null;
+    const dataVersionListeners = [];
+
+    function onDataVersionChange(listener) {
+        dataVersionListeners.push(listener);
+    }
+
+    // Сбрасывает кэши маркеров и подсказок, если данные на сервере обновились
+    function checkDataVersion(response) {
+        const version = response.headers.get('X-Data-Version');
+        if (version && version !== campusDataVersion) {
+            campusDataVersion = version;
+            markerTileCache.clear();
+            markerById.clear();
+            dataVersionListeners.forEach(listener => listener());
+            if (['lazy', 'clustered'].includes(window.campusMarkerMode) && window.leafletMap) {
+                loadViewportMarkers();
+            }
+        }
+        return response;
+    }
+
+    // Возвращает ключи тайлов ("источник/z/x/y"), покрывающих видимую область карты:
+    // на малых масштабах в режиме серверной кластеризации — тайлы кластеров
+    function visibleTileKeys(map) {
+        const zoom = Math.max(0, Math.round(map.getZoom()));
+        const clustered = window.campusMarkerMode === 'clustered' && zoom <= window.campusClusterMaxZoom;
+        const source = clustered ? 'clusters' : 'markers';
+        const z = clustered ? zoom : Math.min(zoom, window.campusTileMaxZoom);
+        const n = Math.pow(2, z);
+        const bounds = map.getBounds();
+        const clamp = (v, min, max) => Math.max(min, Math.min(max, v));
+        const tileX = lon => clamp(Math.floor((lon + 180) / 360 * n), 0, n - 1);
+        const tileY = lat => {
+            const rad = clamp(lat, -85.0511, 85.0511) * Math.PI / 180;
+            return clamp(Math.floor((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2 * n), 0, n - 1);
+        };
+
+        const keys = [];
+        for (let x = tileX(bounds.getWest()); x <= tileX(bounds.getEast()); x++) {
+            for (let y = tileY(bounds.getNorth()); y <= tileY(bounds.getSouth()); y++) {
+                keys.push(`${source}/${z}/${x}/${y}`);
+            }
+        }
+        return keys;
+    }
+
+    // Загружает недостающие тайлы видимой области и перерисовывает маркеры
+    function loadViewportMarkers() {
+        const map = window.leafletMap;
+        const requestId = ++viewportRequest;
+        const keys = visibleTileKeys(map);
+
+        const pending = keys.filter(key => !markerTileCache.has(key)).map(key =>
+            fetch(`/${key}`)
+                .then(checkDataVersion)
+                .then(response => response.json())
+                .then(data => markerTileCache.set(key, data.features))
+        );
+
+        Promise.all(pending)
+            .then(() => {
+                // Обновляем порядок использования и вытесняем самые старые тайлы
+                keys.forEach(key => {
+                    const features = markerTileCache.get(key);
+                    markerTileCache.delete(key);
+                    markerTileCache.set(key, features);
+                });
+                while (markerTileCache.size > TILE_CACHE_LIMIT) {
+                    markerTileCache.delete(markerTileCache.keys().next().value);
+                }
+
+                // Пока тайлы загружались, пользователь мог сдвинуть карту
+                if (requestId === viewportRequest) {
+                    renderViewportMarkers();
+                }
+            })
+            .catch(error => console.error('Ошибка загрузки маркеров:', error));
+    }
+
+    // Показывает маркеры выбранных категорий из тайлов видимой области
+    function renderViewportMarkers() {
+        const map = window.leafletMap;
+        const layer = window.campusMarkerLayer;
+        if (!map || !layer) {
+            return;
+        }
+
+        const selected = new Set(
+            Array.from(document.querySelectorAll('.category-filter:checked'), filter => filter.value)
+        );
+        const markers = new Map();
+
+        visibleTileKeys(map).forEach(key => {
+            (markerTileCache.get(key) || []).forEach(feature => {
+                const props = feature.properties;
+
+                // Размер кластера пересчитываем по выбранным категориям
+                if (props.cluster) {
+                    const count = Object.entries(props.categories)
+                        .filter(([category]) => selected.has(category))
+                        .reduce((sum, [, n]) => sum + n, 0);
+                    if (count > 0) {
+                        markers.set(`cluster-${props.cluster_id}`, createClusterMarker(feature, count));
+                    }
+                    return;
+                }
+
+                if (!selected.has(props.category) || markers.has(props.id)) {
+                    return;
+                }
+                if (!markerById.has(props.id)) {
+                    markerById.set(props.id, createMarker(feature));
+                }
+                markers.set(props.id, markerById.get(props.id));
+            });
+        });
+
+        // У обычной группы слоев (серверная кластеризация) нет пакетного addLayers
+        layer.clearLayers();
+        if (layer.addLayers) {
+            layer.addLayers(Array.from(markers.values()));
+        } else {
+            markers.forEach(marker => layer.addLayer(marker));
+        }
+    }
+
+    // Показывает информационную панель с HTML-кодом, подготовленным на сервере
+    function showDetailsHtml(html) {
+        const infoPanel = document.getElementById('info-panel');
+        const infoTitle = document.getElementById('info-title');
+        const infoContent = document.getElementById('info-content');
+
+        infoContent.innerHTML = html;
+        infoTitle.textContent = infoContent.firstElementChild ? infoContent.firstElementChild.dataset.name : '';
+        infoPanel.style.display = 'block';
+    }
+
+    // Функция для отображения детальной информации о корпусе
+    function showDetails(campusId) {
+        fetch(`/campus/${campusId}/details`)
+            .then(checkDataVersion)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Корпус ${campusId} не найден`);
+                }
+                return response.text();
+            })
+            .then(showDetailsHtml)
+            .catch(error => console.error('Ошибка загрузки информации о корпусе:', error));
+    }
     """
 
-    # Записываем JavaScript файл
-    with open(os.path.join(js_dir, "main.js"), 'w') as f:
-        f.write(main_js)
+    # Записываем JavaScript файл (только при изменении содержимого)
+    write_static_file(os.path.join(js_dir, "main.js"), textwrap.dedent(main_js).lstrip("\n"))
 
 
 # Создаем HTML шаблон для Jinja2
@@ -719,9 +1188,10 @@ def create_html_template():
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta name="campus-data-version" content="{{ data_version }}">
     <title>Карта корпусов ИГУ</title>
-    <link rel="stylesheet" href="{{ url_for('static', path='style.css') }}">
-    <link rel="stylesheet" href="{{ url_for('static', path='dark-theme.css') }}">
+    <link rel="stylesheet" href="{{ asset_url('style.css') }}">
+    <link rel="stylesheet" href="{{ asset_url('dark-theme.css') }}">
     <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;700&display=swap" rel="stylesheet">
     {{ folium_css|safe }}
 </head>
@@ -731,7 +1201,8 @@ def create_html_template():
             <h3>Карта корпусов ИГУ</h3>
 
             <div class="search-container">
-                <input type="text" id="search-input" placeholder="Поиск корпуса...">
+                <input type="text" id="search-input" placeholder="Поиск корпуса..." list="search-suggestions" autocomplete="off">
+                <datalist id="search-suggestions"></datalist>
                 <button id="search-button" class="btn">Найти</button>
             </div>
 
@@ -780,7 +1251,7 @@ def create_html_template():
         </div>
     </div>
 
-    <script src="{{ url_for('static', path='main.js') }}"></script>
+    <script src="{{ asset_url('main.js') }}"></script>
     {{ folium_js|safe }}
 </body>
 </html>
@@ -789,35 +1260,135 @@ def create_html_template():
     # Создаем директорию для шаблонов, если она не существует
     os.makedirs(templates_dir, exist_ok=True)
 
-    # Записываем шаблон
-    with open(os.path.join(templates_dir, "index.html"), 'w') as f:
-        f.write(template)
+    # Записываем шаблон (только при изменении содержимого)
+    write_static_file(os.path.join(templates_dir, "index.html"), template)
+
+
+class MapGlobals(MacroElement):
+    """Делает объект карты и слой маркеров доступными скриптам страницы"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            window.leafletMap = {{ this._parent.get_name() }};
+            window.campusMarkerLayer = {{ this.marker_layer.get_name() }};
+            window.campusMarkerMode = {{ this.mode|tojson }};
+            window.campusTileMaxZoom = {{ this.tile_max_zoom }};
+            window.campusClusterMaxZoom = {{ this.cluster_max_zoom }};
+        {% endmacro %}
+    """)
+
+    def __init__(self, marker_layer, mode="static"):
+        super().__init__()
+        self._name = "MapGlobals"
+        self.marker_layer = marker_layer
+        self.mode = mode
+        self.tile_max_zoom = LAZY_TILE_MAX_ZOOM
+        self.cluster_max_zoom = CLUSTER_MAX_ZOOM
+
+
+# HTML-код всплывающего окна корпуса
+def build_popup_html(campus):
+    """Формирует HTML-код всплывающего окна с краткой информацией о корпусе"""
+    return f"""
+            <div style="min-width: 200px;">
+                <h4>{escape(campus['name'])}</h4>
+                <p><strong>Адрес:</strong> {escape(campus['address'])}</p>
+                <p><strong>Категория:</strong> {escape(campus['category'].capitalize())}</p>
+                <p><strong>Телефон:</strong> {escape(str(campus.get('phone', '')))}</p>
+                <a href="{escape(campus.get('website', ''))}" target="_blank">Сайт</a>
+                <button onclick="showDetails({int(campus['id'])})" style="display: block; margin-top: 10px;">Подробнее</button>
+            </div>
+            """
+
+
+# HTML-код информационной панели корпуса
+def build_details_html(campus):
+    """Формирует HTML-код с подробной информацией о корпусе для информационной панели"""
+    rows = [
+        ("Адрес", campus.get("address")),
+        ("Категория", campus["category"].capitalize()),
+        ("Телефон", campus.get("phone")),
+        ("Год постройки", campus.get("year_built")),
+        ("Количество этажей", campus.get("floors")),
+        ("Вместимость студентов", campus.get("students_capacity")),
+        ("Вместимость", campus.get("capacity")),
+        ("Факультеты", ", ".join(campus.get("faculties", []))),
+        ("Удобства", ", ".join(campus.get("facilities", []))),
+        ("Услуги", ", ".join(campus.get("services", [])))
+    ]
+
+    html = f'<div class="campus-details" data-name="{escape(campus["name"])}">'
+    for label, value in rows:
+        if value:
+            html += f"<p><strong>{label}:</strong> {escape(str(value))}</p>"
+
+    if campus.get("meal_times"):
+        html += "<p><strong>Время приёма пищи:</strong></p><ul>"
+        for meal, time in campus["meal_times"].items():
+            html += f"<li>{escape(meal)}: {escape(time)}</li>"
+        html += "</ul>"
+
+    if campus.get("website"):
+        html += f'<p><a href="{escape(campus["website"])}" target="_blank">Официальный сайт</a></p>'
+    return html + "</div>"
+
+
+class CampusMarkers(MacroElement):
+    """Добавляет маркеры корпусов в слой из заранее сериализованного GeoJSON"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            renderMarkers({{ this.geojson }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, geojson: bytes):
+        super().__init__()
+        self._name = "CampusMarkers"
+        # "</" экранируется, чтобы данные не закрыли тег <script> раньше времени
+        self.geojson = geojson.decode("utf-8").replace("</", "<\\/")
 
 
 # Функция для создания карты с Folium
-def create_map(filter_categories=None):
+def create_map(filter_categories=None, lazy=False, campuses=None, proxy_tiles=False):
     """
     Создает карту с использованием Folium
 
+    Карта встраивается прямо в страницу (без iframe), чтобы скрипты страницы
+    могли обновлять слой маркеров без перезагрузки.
+
     Args:
         filter_categories (list): Список категорий для отображения
+        lazy (bool): Не встраивать маркеры — браузер загрузит их по видимой области
+        campuses (list): Записи о корпусах (по умолчанию — текущие campus_data)
+        proxy_tiles (bool): Загружать подложку через локальный прокси /tiles/{слой}/...
 
     Returns:
-        str: HTML-код карты
+        dict: Части карты для шаблона — "css" (для <head>), "html" и "js"
     """
     # Создаем базовую карту, центрированную на координатах ИГУ
     m = folium.Map(
         location=[52.2851, 104.2813],  # Координаты главного корпуса ИГУ
         zoom_start=14,
-        tiles="OpenStreetMap",
+        tiles=None if proxy_tiles else "OpenStreetMap",
         control_scale=True
     )
 
-    # Добавляем дополнительные слои карты
-    folium.TileLayer("CartoDB dark_matter", name="Тёмная карта").add_to(m)
-    folium.TileLayer("CartoDB positron", name="Светлая карта").add_to(m)
-    folium.TileLayer("Stamen Terrain", name="Рельеф").add_to(m)
-    folium.TileLayer("Stamen Watercolor", name="Акварель").add_to(m)
+    if proxy_tiles:
+        # Все слои подложки идут через локальный прокси с дисковым кэшем
+        for layer, config in BASE_LAYERS.items():
+            folium.TileLayer(
+                f"/tiles/{layer}/{{z}}/{{x}}/{{y}}.png",
+                name=config["title"],
+                attr=tile_attribution(layer),
+                max_zoom=TILE_PROXY_MAX_ZOOM
+            ).add_to(m)
+    else:
+        # Добавляем дополнительные слои карты
+        folium.TileLayer("CartoDB dark_matter", name="Тёмная карта").add_to(m)
+        folium.TileLayer("CartoDB positron", name="Светлая карта").add_to(m)
+        folium.TileLayer("Stamen Terrain", name="Рельеф").add_to(m)
+        folium.TileLayer("Stamen Watercolor", name="Акварель").add_to(m)
 
     # Добавляем контроль слоев
     folium.LayerControl().add_to(m)
@@ -826,114 +1397,1706 @@ def create_map(filter_categories=None):
     Fullscreen().add_to(m)
     MeasureControl(position="topleft", primary_length_unit="kilometers", secondary_length_unit="miles").add_to(m)
     LocateControl(auto_start=False).add_to(m)
-    MiniMap().add_to(m)
+    if proxy_tiles:
+        MiniMap(tile_layer=folium.TileLayer("/tiles/osm/{z}/{x}/{y}.png", attr=tile_attribution("osm"))).add_to(m)
+    else:
+        MiniMap().add_to(m)
     Draw(export=True).add_to(m)
 
-    # Создаем кластеризацию маркеров
-    marker_cluster = MarkerCluster().add_to(m)
+    if lazy and SERVER_CLUSTERS:
+        # Кластеры приходят с сервера готовыми, поэтому слой — обычная группа маркеров;
+        # стили MarkerCluster подключаем для оформления значков кластеров
+        mode = "clustered"
+        marker_cluster = folium.FeatureGroup(name="Корпуса", control=False).add_to(m)
+        for name, url in MarkerCluster.default_css:
+            m.get_root().header.add_child(CssLink(url), name=name)
+    else:
+        # Создаем кластеризацию маркеров
+        mode = "lazy" if lazy else "static"
+        marker_cluster = MarkerCluster().add_to(m)
 
     # Если категории для фильтрации не указаны, показываем все
     if filter_categories is None:
         filter_categories = list(category_colors.keys())
 
-    # Добавляем маркеры на карту
-    for campus in campus_data:
-        if campus["category"] in filter_categories:
-            # Создаем всплывающее окно с информацией
-            popup_content = f"""
-            <div style="min-width: 200px;">
-                <h4>{campus['name']}</h4>
-                <p><strong>Адрес:</strong> {campus['address']}</p>
-                <p><strong>Категория:</strong> {campus['category'].capitalize()}</p>
-                <p><strong>Телефон:</strong> {campus['phone']}</p>
-                <a href="{campus['website']}" target="_blank">Сайт</a>
-                <button onclick="showDetails({campus['id']})" style="display: block; margin-top: 10px;">Подробнее</button>
-            </div>
-            """
-
-            # Создаем маркер с иконкой соответствующей категории
-            icon = folium.Icon(color=category_colors[campus["category"]], icon="info-sign")
+    MapGlobals(marker_cluster, mode=mode).add_to(m)
+
+    # Добавляем маркеры на карту из готовых GeoJSON-объектов (в ленивом режиме слой остается пустым)
+    if not lazy:
+        records = [
+            get_campus_record(campus)
+            for campus in (campus_data if campuses is None else campuses)
+            if campus["category"] in filter_categories
+        ]
+        CampusMarkers(feature_collection_bytes(record.feature for record in records)).add_to(m)
+
+    # Разбиваем отрисованную карту на части для встраивания в шаблон
+    root = m.get_root()
+    root.render()
+    return {
+        "css": root.header.render(),
+        "html": root.html.render(),
+        "js": f"<script>{root.script.render()}</script>"
+    }
 
-            folium.Marker(
-                location=[campus["lat"], campus["lon"]],
-                popup=folium.Popup(popup_content, max_width=300),
-                tooltip=campus["name"],
-                icon=icon
-            ).add_to(marker_cluster)
 
-    return m._repr_html_()
+# Кэш GeoJSON-ответов фильтра: {(версия данных, набор категорий): байты JSON}
+geojson_cache: Dict[Any, bytes] = {}
 
 
-# API для фильтрации и поиска
-@app.get("/filter")
-async def filter_map(category: str, show: bool = True):
-    """API для фильтрации карты по категориям"""
-    return {"status": "success", "category": category, "show": show}
+def feature_collection_bytes(features) -> bytes:
+    """Собирает FeatureCollection из уже сериализованных GeoJSON-объектов"""
+    return b'{"type":"FeatureCollection","features":[' + b",".join(features) + b"]}"
+
+
+def build_campus_feature(campus):
+    """Формирует GeoJSON-объект (Feature) для корпуса"""
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [campus["lon"], campus["lat"]]},
+        "properties": {
+            "id": campus["id"],
+            "name": campus["name"],
+            "category": campus["category"],
+            "color": category_colors[campus["category"]],
+            "popup": build_popup_html(campus)
+        }
+    }
+
+
+def get_filtered_geojson(filter_categories=None):
+    """
+    Возвращает GeoJSON (FeatureCollection) с корпусами выбранных категорий
+
+    Args:
+        filter_categories (list): Список категорий для отображения
+
+    Returns:
+        bytes: Сериализованный FeatureCollection
+    """
+    key = map_cache_key(filter_categories)
+
+    body = geojson_cache.get(key)
+    if body is None:
+        records = get_campus_records()
+        body = feature_collection_bytes(records[c["id"]].feature for c in campus_data if c["category"] in key[1])
+        for stale_key in [k for k in geojson_cache if k[0] != key[0]]:
+            geojson_cache.pop(stale_key, None)
+        geojson_cache[key] = body
+
+    return body
+
+
+# API для фильтрации и поиска
+@app.get("/filter")
+async def filter_map(request: Request, category: List[str] = Query(default=[])):
+    """API для фильтрации карты по категориям: возвращает GeoJSON с маркерами выбранных категорий"""
+    body = get_filtered_geojson(category)
+
+    etag = compute_etag(body)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(
+        content=body,
+        media_type="application/geo+json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+
+# Поля, по которым ищутся корпуса, и их вес в ранжировании
+SEARCH_FIELDS = {
+    "name": 3.0,
+    "faculties": 2.0,
+    "address": 1.5,
+    "services": 1.0,
+    "facilities": 1.0
+}
+
+# Русские окончания для облегченного стемминга (от длинных к коротким)
+RUSSIAN_ENDINGS = sorted([
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ый", "ий", "ой", "ей", "ую", "юю",
+    "ов", "ев", "ам", "ям", "ах", "ях", "ом", "ем",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й"
+], key=len, reverse=True)
+
+# Минимальная длина основы словаря, которая совпадает с запросом как его начало
+STEM_PREFIX_MIN = 4
+
+# Поисковый индекс: {"version": версия данных, "postings": {основа: {id: вес}},
+# "vocabulary": отсортированные основы, "trigrams": {триграмма: {основы}}, "campuses": {id: корпус}}
+search_index: Dict[str, Any] = {"version": None}
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к нижнему регистру, заменяет ё на е и убирает знаки препинания"""
+    return re.sub(r"[^\w]+", " ", text.lower().replace("ё", "е")).strip()
+
+
+def stem_token(token: str) -> str:
+    """Отсекает распространенное русское окончание, оставляя основу не короче трех символов"""
+    for ending in RUSSIAN_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= 3:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на нормализованные основы слов"""
+    return [stem_token(token) for token in normalize_text(text).split()]
+
+
+def token_trigrams(token: str):
+    """Возвращает множество триграмм слова (с маркерами границ)"""
+    padded = f"#{token}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Расстояние Левенштейна с ранним выходом, если оно превышает limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def campus_search_terms(campus) -> Dict[str, float]:
+    """Возвращает основы слов корпуса с весом лучшего поля, в котором они встречаются"""
+    terms: Dict[str, float] = {}
+    for field, weight in SEARCH_FIELDS.items():
+        value = campus.get(field)
+        if not value:
+            continue
+        text = " ".join(value) if isinstance(value, list) else str(value)
+        for token in tokenize(text):
+            terms[token] = max(terms.get(token, 0.0), weight)
+    return terms
+
+
+def build_search_index(campuses, version):
+    """
+    Строит поисковый индекс по списку корпусов
+
+    Returns:
+        dict: Инвертированный индекс, словарь основ и триграммный индекс
+    """
+    postings: Dict[str, Dict[int, float]] = {}
+    for campus in campuses:
+        for token, weight in campus_search_terms(campus).items():
+            postings.setdefault(token, {})[campus["id"]] = weight
+
+    trigrams: Dict[str, set] = {}
+    for token in postings:
+        for trigram in token_trigrams(token):
+            trigrams.setdefault(trigram, set()).add(token)
+
+    return {
+        "version": version,
+        "postings": postings,
+        "vocabulary": sorted(postings),
+        "trigrams": trigrams,
+        "campuses": {campus["id"]: campus for campus in campuses}
+    }
+
+
+def update_search_index(index, removed, added, version):
+    """
+    Обновляет поисковый индекс по изменившимся корпусам, не трогая исходный (копирование при записи)
+
+    Args:
+        index (dict): Индекс предыдущей версии данных
+        removed (list): Прежние записи удаленных и измененных корпусов
+        added (list): Новые записи добавленных и измененных корпусов
+        version (str): Новая версия данных
+
+    Returns:
+        dict: Новый индекс
+    """
+    postings = dict(index["postings"])
+    campuses = dict(index["campuses"])
+    touched = set()
+
+    for campus in removed:
+        campuses.pop(campus["id"], None)
+        for token in campus_search_terms(campus):
+            entry = {cid: w for cid, w in postings.get(token, {}).items() if cid != campus["id"]}
+            if entry:
+                postings[token] = entry
+            else:
+                postings.pop(token, None)
+            touched.add(token)
+
+    for campus in added:
+        campuses[campus["id"]] = campus
+        for token, weight in campus_search_terms(campus).items():
+            postings[token] = {**postings.get(token, {}), campus["id"]: weight}
+            touched.add(token)
+
+    # Словарь и триграммы меняются только для появившихся и исчезнувших основ
+    vocabulary = list(index["vocabulary"])
+    trigrams = dict(index["trigrams"])
+    for token in touched:
+        position = bisect_left(vocabulary, token)
+        present = position < len(vocabulary) and vocabulary[position] == token
+        if present == (token in postings):
+            continue
+        if present:
+            del vocabulary[position]
+        else:
+            vocabulary.insert(position, token)
+        for trigram in token_trigrams(token):
+            tokens = set(trigrams.get(trigram, ()))
+            if present:
+                tokens.discard(token)
+            else:
+                tokens.add(token)
+            if tokens:
+                trigrams[trigram] = tokens
+            else:
+                trigrams.pop(trigram, None)
+
+    return {
+        "version": version,
+        "postings": postings,
+        "vocabulary": vocabulary,
+        "trigrams": trigrams,
+        "campuses": campuses
+    }
+
+
+def get_search_index():
+    """
+    Возвращает поисковый индекс, перестраивая его при смене версии данных
+
+    Returns:
+        dict: Инвертированный индекс, словарь основ и триграммный индекс
+    """
+    if search_index.get("version") != data_version:
+        search_index.update(build_search_index(campus_data, data_version))
+    return search_index
+
+
+def match_token(index, token: str):
+    """
+    Находит основы словаря, соответствующие слову запроса
+
+    Точное совпадение весит 1.0, совпадение по префиксу (основа словаря
+    начинается с основы запроса или, если она не короче STEM_PREFIX_MIN символов,
+    сама является началом основы запроса) — 0.8, опечатка (одна правка, для
+    длинных слов — две) — 0.6.
+
+    Returns:
+        dict: {основа: вес совпадения}
+    """
+    matches = {}
+    if token in index["postings"]:
+        matches[token] = 1.0
+
+    vocabulary = index["vocabulary"]
+    position = bisect_left(vocabulary, token)
+    while position < len(vocabulary) and vocabulary[position].startswith(token):
+        matches.setdefault(vocabulary[position], 0.8)
+        position += 1
+
+    # Укороченные основы словаря: "биолого-почвенный" индексируется как "биол",
+    # а запрос "биологический" дает основу "биологическ"
+    for length in range(STEM_PREFIX_MIN, len(token)):
+        if token[:length] in index["postings"]:
+            matches.setdefault(token[:length], 0.8)
+
+    if len(token) >= 4:
+        limit = 1 if len(token) < 7 else 2
+        query_trigrams = token_trigrams(token)
+        candidates: Dict[str, int] = {}
+        for trigram in query_trigrams:
+            for candidate in index["trigrams"].get(trigram, ()):
+                candidates[candidate] = candidates.get(candidate, 0) + 1
+        for candidate, shared in candidates.items():
+            # Кандидаты без заметной доли общих триграмм не проверяем расстоянием
+            if candidate in matches or shared * 3 < len(query_trigrams):
+                continue
+            if edit_distance(token, candidate, limit) <= limit:
+                matches[candidate] = 0.6
+
+    return matches
+
+
+def search_campuses(term: str):
+    """
+    Ищет корпуса по индексу и ранжирует результаты
+
+    Корпус попадает в выдачу, если в нем найдено каждое слово запроса; вес
+    складывается из веса поля и качества совпадения.
+
+    Returns:
+        list: Пары (вес, корпус), отсортированные по убыванию веса
+    """
+    index = get_search_index()
+    tokens = list(dict.fromkeys(tokenize(term)))
+    if not tokens:
+        return []
+
+    scores: Optional[Dict[int, float]] = None
+    for token in tokens:
+        token_scores: Dict[int, float] = {}
+        for stem, quality in match_token(index, token).items():
+            for campus_id, weight in index["postings"][stem].items():
+                token_scores[campus_id] = max(token_scores.get(campus_id, 0.0), quality * weight)
+
+        if scores is None:
+            scores = token_scores
+        else:
+            scores = {cid: score + token_scores[cid] for cid, score in scores.items() if cid in token_scores}
+        if not scores:
+            return []
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(score, index["campuses"][campus_id]) for campus_id, score in ranked]
+
+
+# Приоритет видов подсказок (меньше — выше в списке)
+SUGGEST_KINDS = {"name": 0, "faculty": 1, "address": 2}
+
+# Сколько записей из диапазона префикса просматривается для выбора лучших подсказок
+SUGGEST_SCAN_LIMIT = 500
+
+# Индекс подсказок: {"version": версия данных, "keys": отсортированные ключи, "entries": записи}
+suggest_index: Dict[str, Any] = {"version": None}
+
+
+def get_suggest_index():
+    """
+    Возвращает отсортированный индекс подсказок, перестраивая его при смене версии данных
+
+    Для каждой фразы (название, факультет, адрес) в индекс попадает нормализованный
+    текст, начиная с каждого слова, чтобы подсказка находилась и по середине фразы.
+
+    Returns:
+        dict: Отсортированные ключи и соответствующие им записи (ключ, вид, номер слова, текст, id)
+    """
+    if suggest_index.get("version") != data_version:
+        entries = [entry for campus in campus_data for entry in campus_suggest_entries(campus)]
+        entries.sort()
+        suggest_index.update(version=data_version, keys=[entry[0] for entry in entries], entries=entries)
+    return suggest_index
+
+
+def campus_suggest_entries(campus):
+    """Возвращает записи индекса подсказок для одного корпуса"""
+    entries = []
+    phrases = [("name", campus["name"]), ("address", campus["address"])]
+    phrases += [("faculty", faculty) for faculty in campus.get("faculties", [])]
+    for kind, text in phrases:
+        words = normalize_text(text).split()
+        for position in range(len(words)):
+            key = " ".join(words[position:])
+            entries.append((key, SUGGEST_KINDS[kind], position, text, kind, campus["id"]))
+    return entries
+
+
+def update_suggest_index(index, affected_ids, added, version):
+    """
+    Обновляет индекс подсказок: убирает записи затронутых корпусов и добавляет новые
+
+    Returns:
+        dict: Новый индекс (исходный не изменяется)
+    """
+    entries = [entry for entry in index["entries"] if entry[5] not in affected_ids]
+    entries.extend(entry for campus in added for entry in campus_suggest_entries(campus))
+    # Список почти отсортирован, поэтому сортировка выполняется за время, близкое к линейному
+    entries.sort()
+    return {"version": version, "keys": [entry[0] for entry in entries], "entries": entries}
+
+
+def suggest(prefix: str, k: int):
+    """
+    Возвращает до k подсказок, начинающихся с prefix (с начала фразы или любого ее слова)
+
+    Returns:
+        list: Подсказки {"text", "kind", "id"} — сначала названия, затем факультеты и адреса
+    """
+    prefix = normalize_text(prefix)
+    if not prefix:
+        return []
+
+    index = get_suggest_index()
+    start = bisect_left(index["keys"], prefix)
+    candidates = []
+    for entry in index["entries"][start:start + SUGGEST_SCAN_LIMIT]:
+        if not entry[0].startswith(prefix):
+            break
+        candidates.append(entry)
+
+    suggestions = []
+    seen = set()
+    for _, _, _, text, kind, campus_id in sorted(candidates, key=lambda e: (e[1], e[2], e[3])):
+        if text in seen:
+            continue
+        seen.add(text)
+        suggestions.append({"text": text, "kind": kind, "id": campus_id})
+        if len(suggestions) == k:
+            break
+    return suggestions
+
+
+@app.get("/suggest")
+async def suggest_campus(prefix: str, k: int = Query(8, ge=1, le=50)):
+    """API подсказок для строки поиска (названия корпусов, факультеты, адреса)"""
+    return JSONResponse(
+        {"suggestions": suggest(prefix, k)},
+        headers={"Cache-Control": "public, max-age=60"}
+    )
 
 
 @app.get("/search")
-async def search_campus(term: str):
-    """API для поиска корпусов по названию или адресу"""
-    term = term.lower()
+async def search_campus(
+    term: str,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """API для поиска корпусов по названию, адресу, факультетам и услугам с ранжированием"""
+    ranked = search_campuses(term)
+
     results = []
+    for score, campus in ranked[offset:offset + limit]:
+        results.append({**campus_summary(campus), "address": campus["address"], "score": round(score, 3)})
 
-    for campus in campus_data:
-        if term in campus["name"].lower() or term in campus["address"].lower():
-            results.append(campus)
+    return {"results": results, "total": len(ranked), "limit": limit, "offset": offset}
 
-    return {"results": results}
+
+class CampusRecord:
+    """
+    Компактная запись корпуса с заранее подготовленными ответами: JSON с данными,
+    HTML-код информационной панели и GeoJSON-объект с всплывающим окном
+    """
+
+    __slots__ = ("id", "name", "category", "lat", "lon", "source", "body", "etag",
+                 "details", "details_etag", "feature")
+
+    def __init__(self, campus: Dict[str, Any]):
+        self.id = campus["id"]
+        self.name = campus["name"]
+        self.category = campus["category"]
+        self.lat = campus["lat"]
+        self.lon = campus["lon"]
+        self.source = campus
+        self.body = json.dumps(campus, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = compute_etag(self.body)
+        self.details = build_details_html(campus).encode("utf-8")
+        self.details_etag = compute_etag(self.details)
+        self.feature = json.dumps(
+            build_campus_feature(campus), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+# Хранилище записей корпусов: {"version": версия данных, "records": {id: CampusRecord}}
+campus_store: Dict[str, Any] = {"version": None, "records": {}}
+
+
+def get_campus_records():
+    """
+    Возвращает записи корпусов по id, перестраивая хранилище при смене версии данных
+
+    Returns:
+        dict: {id: CampusRecord}
+    """
+    if campus_store["version"] != data_version:
+        records = {campus["id"]: CampusRecord(campus) for campus in campus_data}
+        campus_store.update(version=data_version, records=records)
+    return campus_store["records"]
+
+
+def get_campus_record(campus):
+    """
+    Возвращает запись хранилища для корпуса, а если хранилище построено для
+    других данных (например, при отрисовке в пуле во время обновления) — новую запись
+    """
+    record = campus_store["records"].get(campus["id"])
+    if record is None or record.source != campus:
+        record = CampusRecord(campus)
+    return record
+
+
+@app.get("/campus/{campus_id}/details", response_class=HTMLResponse)
+async def get_campus_details_html(request: Request, campus_id: int):
+    """API с готовым HTML-кодом информационной панели корпуса"""
+    record = get_campus_records().get(campus_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Корпус не найден")
+
+    if etag_matches(request, record.details_etag):
+        return Response(status_code=304, headers={"ETag": record.details_etag})
+
+    return Response(
+        content=record.details,
+        media_type="text/html; charset=utf-8",
+        headers={"ETag": record.details_etag, "Cache-Control": "no-cache"}
+    )
 
 
 @app.get("/campus/{campus_id}")
-async def get_campus_details(campus_id: int):
+async def get_campus_details(request: Request, campus_id: int):
     """API для получения детальной информации о корпусе"""
-    for campus in campus_data:
-        if campus["id"] == campus_id:
-            return campus
+    record = get_campus_records().get(campus_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Корпус не найден")
+
+    if etag_matches(request, record.etag):
+        return Response(status_code=304, headers={"ETag": record.etag})
+
+    return Response(
+        content=record.body,
+        media_type="application/json",
+        headers={"ETag": record.etag, "Cache-Control": "no-cache"}
+    )
+
+
+# Размер ячейки сетки пространственного индекса в градусах (~1 км по широте)
+SPATIAL_CELL_SIZE = float(os.environ.get("ISU_MAP_GRID_CELL", "0.01"))
+
+# Средний радиус Земли в метрах
+EARTH_RADIUS_M = 6371008.8
+
+# Пространственный индекс по сетке: {"version": версия данных, "cells": {(x, y): [корпуса]}}
+spatial_index: Dict[str, Any] = {"version": None, "cells": {}}
+
+
+def grid_cell(lat: float, lon: float):
+    """Возвращает координаты ячейки сетки, в которую попадает точка"""
+    return math.floor(lon / SPATIAL_CELL_SIZE), math.floor(lat / SPATIAL_CELL_SIZE)
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками по поверхности Земли в метрах"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def get_spatial_cells():
+    """
+    Возвращает ячейки пространственного индекса, перестраивая его при смене версии данных
+
+    Returns:
+        dict: {(x, y): [корпуса в ячейке]}
+    """
+    if spatial_index["version"] != data_version:
+        cells: Dict[Any, List[Dict[str, Any]]] = {}
+        for campus in campus_data:
+            cells.setdefault(grid_cell(campus["lat"], campus["lon"]), []).append(campus)
+        spatial_index.update(version=data_version, cells=cells)
+    return spatial_index["cells"]
+
+
+def update_spatial_cells(cells, removed, added):
+    """
+    Обновляет ячейки пространственного индекса, копируя только затронутые ячейки
+
+    Returns:
+        dict: Новые ячейки {(x, y): [корпуса]}
+    """
+    cells = dict(cells)
+    for campus in removed:
+        key = grid_cell(campus["lat"], campus["lon"])
+        remaining = [c for c in cells.get(key, ()) if c["id"] != campus["id"]]
+        if remaining:
+            cells[key] = remaining
+        else:
+            cells.pop(key, None)
+    for campus in added:
+        key = grid_cell(campus["lat"], campus["lon"])
+        cells[key] = cells.get(key, []) + [campus]
+    return cells
+
+
+def campus_summary(campus):
+    """Краткое представление корпуса для списков на карте"""
+    return {
+        "id": campus["id"],
+        "name": campus["name"],
+        "category": campus["category"],
+        "lat": campus["lat"],
+        "lon": campus["lon"]
+    }
+
+
+def query_bbox(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """
+    Находит корпуса внутри прямоугольной области
+
+    Returns:
+        list: Корпуса, попадающие в область
+    """
+    cells = get_spatial_cells()
+    min_x, min_y = grid_cell(min_lat, min_lon)
+    max_x, max_y = grid_cell(max_lat, max_lon)
+
+    results = []
+    # Для больших областей дешевле перебрать непустые ячейки, чем все ячейки области
+    if (max_x - min_x + 1) * (max_y - min_y + 1) > len(cells):
+        candidate_cells = [c for (x, y), c in cells.items() if min_x <= x <= max_x and min_y <= y <= max_y]
+    else:
+        candidate_cells = [cells[(x, y)] for x in range(min_x, max_x + 1)
+                           for y in range(min_y, max_y + 1) if (x, y) in cells]
+
+    for cell in candidate_cells:
+        for campus in cell:
+            if min_lon <= campus["lon"] <= max_lon and min_lat <= campus["lat"] <= max_lat:
+                results.append(campus)
+    return results
+
+
+def query_nearest(lat: float, lon: float, k: int):
+    """
+    Находит k ближайших корпусов, обходя ячейки сетки кольцами от точки запроса
+
+    Returns:
+        list: Пары (расстояние в метрах, корпус), отсортированные по расстоянию
+    """
+    cells = get_spatial_cells()
+    if not cells or k <= 0:
+        return []
+
+    cx, cy = grid_cell(lat, lon)
+    xs = [x for x, _ in cells]
+    ys = [y for _, y in cells]
+    max_ring = max(abs(cx - min(xs)), abs(cx - max(xs)), abs(cy - min(ys)), abs(cy - max(ys)))
+    meters_per_degree = math.pi * EARTH_RADIUS_M / 180
+
+    # Максимальная куча из k лучших кандидатов: (-расстояние, id, корпус)
+    best = []
+
+    def consider(cell):
+        for campus in cell:
+            item = (-haversine_m(lat, lon, campus["lat"], campus["lon"]), campus["id"], campus)
+            if len(best) < k:
+                heapq.heappush(best, item)
+            elif item[0] > best[0][0]:
+                heapq.heapreplace(best, item)
+
+    for ring in range(max_ring + 1):
+        # На разреженных данных кольцо становится больше числа непустых ячеек —
+        # тогда дешевле один раз просмотреть все оставшиеся ячейки
+        if (2 * ring + 1) ** 2 > len(cells):
+            for (x, y), cell in cells.items():
+                if max(abs(x - cx), abs(y - cy)) >= ring:
+                    consider(cell)
+            break
+
+        for x in range(cx - ring, cx + ring + 1):
+            for y in range(cy - ring, cy + ring + 1):
+                if max(abs(x - cx), abs(y - cy)) == ring and (x, y) in cells:
+                    consider(cells[(x, y)])
+
+        if len(best) == k:
+            # Нижняя оценка расстояния до любой точки за пределами просмотренных колец
+            lon_gap = min(lon - (cx - ring) * SPATIAL_CELL_SIZE, (cx + ring + 1) * SPATIAL_CELL_SIZE - lon)
+            lat_gap = min(lat - (cy - ring) * SPATIAL_CELL_SIZE, (cy + ring + 1) * SPATIAL_CELL_SIZE - lat)
+            polar_lat = min(90.0, max(abs((cy - ring) * SPATIAL_CELL_SIZE), abs((cy + ring + 1) * SPATIAL_CELL_SIZE)))
+            bound = min(lat_gap, lon_gap * math.cos(math.radians(polar_lat))) * meters_per_degree
+            if -best[0][0] <= bound:
+                break
+
+    return [(-neg_dist, campus) for neg_dist, _, campus in sorted(best, reverse=True)]
+
+
+@app.get("/campuses")
+async def campuses_in_bbox(bbox: str, category: List[str] = Query(default=None)):
+    """API для получения корпусов в видимой области карты (bbox=minlon,minlat,maxlon,maxlat)"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox должен иметь вид minlon,minlat,maxlon,maxlat")
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        raise HTTPException(status_code=400, detail="Границы bbox должны быть конечными числами")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="Некорректные границы bbox")
+
+    # Области за пределами допустимых координат обрезаются, чтобы не перебирать лишние ячейки сетки
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+
+    results = [
+        campus_summary(campus)
+        for campus in query_bbox(min_lon, min_lat, max_lon, max_lat)
+        if not category or campus["category"] in category
+    ]
+    return {"results": results}
+
+
+@app.get("/nearest")
+async def nearest_campuses(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100)
+):
+    """API для поиска ближайших к точке корпусов"""
+    results = []
+    for distance, campus in query_nearest(lat, lon, k):
+        results.append({**campus_summary(campus), "distance_m": round(distance, 1)})
+    return {"results": results}
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """
+    Возвращает границы тайла веб-меркатора
+
+    Returns:
+        tuple: (min_lon, min_lat, max_lon, max_lat)
+    """
+    n = 2 ** z
+
+    def tile_lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return x / n * 360 - 180, tile_lat(y + 1), (x + 1) / n * 360 - 180, tile_lat(y)
+
+
+def check_tile(z: int, x: int, y: int, max_zoom: int = 22):
+    """Проверяет координаты тайла и отвечает 404 для несуществующих"""
+    if not 0 <= z <= max_zoom or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Тайл не найден")
+
+
+@app.get("/markers/{z}/{x}/{y}")
+async def markers_tile(request: Request, z: int, x: int, y: int):
+    """API с маркерами корпусов в тайле (GeoJSON) для ленивой загрузки видимой области"""
+    check_tile(z, x, y)
+
+    records = get_campus_records()
+    body = feature_collection_bytes(records[campus["id"]].feature for campus in query_bbox(*tile_bounds(z, x, y)))
+
+    etag = compute_etag(body)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(
+        content=body,
+        media_type="application/geo+json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+
+# Иерархический индекс кластеров: {"version": версия данных, "tiles": {z: {(x, y): [кластеры]}}}
+cluster_index: Dict[str, Any] = {"version": None, "tiles": {}}
+
 
-    return {"error": "Campus not found"}
+def mercator_xy(lat: float, lon: float):
+    """Проецирует точку в координаты веб-меркатора в диапазоне [0, 1]"""
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - 0.25 * math.log((1 + sin_lat) / (1 - sin_lat)) / math.pi
+    return lon / 360 + 0.5, min(1.0, max(0.0, y))
+
+
+def mercator_latlon(x: float, y: float):
+    """Обратное преобразование координат веб-меркатора в широту и долготу"""
+    return math.degrees(2 * math.atan(math.exp((1 - 2 * y) * math.pi))) - 90, (x - 0.5) * 360
+
+
+def cluster_level(points, zoom: int):
+    """
+    Объединяет точки предыдущего (более крупного) масштаба в кластеры масштаба zoom
+
+    Args:
+        points (list): Точки и кластеры масштаба zoom + 1
+        zoom (int): Масштаб, для которого строятся кластеры
+
+    Returns:
+        list: Точки и кластеры масштаба zoom
+    """
+    radius = CLUSTER_RADIUS_PX / (CLUSTER_EXTENT_PX * 2 ** zoom)
+
+    grid: Dict[Any, List[int]] = {}
+    for i, point in enumerate(points):
+        grid.setdefault((int(point["x"] / radius), int(point["y"] / radius)), []).append(i)
+
+    visited = [False] * len(points)
+    clusters = []
+    for i, point in enumerate(points):
+        if visited[i]:
+            continue
+        visited[i] = True
+
+        gx, gy = int(point["x"] / radius), int(point["y"] / radius)
+        neighbors = [
+            j
+            for cx in (gx - 1, gx, gx + 1)
+            for cy in (gy - 1, gy, gy + 1)
+            for j in grid.get((cx, cy), ())
+            if not visited[j]
+            and (points[j]["x"] - point["x"]) ** 2 + (points[j]["y"] - point["y"]) ** 2 <= radius ** 2
+        ]
+        if not neighbors:
+            clusters.append(point)
+            continue
+
+        members = [point] + [points[j] for j in neighbors]
+        count = sum(m["count"] for m in members)
+        categories: Dict[str, int] = {}
+        for member in members:
+            for category, n in member["categories"].items():
+                categories[category] = categories.get(category, 0) + n
+        for j in neighbors:
+            visited[j] = True
+
+        clusters.append({
+            "id": f"{zoom}-{len(clusters)}",
+            "x": sum(m["x"] * m["count"] for m in members) / count,
+            "y": sum(m["y"] * m["count"] for m in members) / count,
+            "count": count,
+            "categories": categories,
+            "expansion_zoom": zoom + 1,
+            "campus": None
+        })
+    return clusters
+
+
+def get_cluster_tiles():
+    """
+    Возвращает индекс кластеров по масштабам и тайлам, перестраивая его при смене версии данных
+
+    Returns:
+        dict: {z: {(x, y): [точки и кластеры тайла]}}
+    """
+    version, campuses = dataset_snapshot()
+    if cluster_index["version"] != version:
+        points = []
+        for campus in campuses:
+            x, y = mercator_xy(campus["lat"], campus["lon"])
+            points.append({
+                "id": campus["id"], "x": x, "y": y, "count": 1,
+                "categories": {campus["category"]: 1}, "campus": campus
+            })
+
+        tiles = {}
+        for zoom in range(CLUSTER_MAX_ZOOM, -1, -1):
+            points = cluster_level(points, zoom)
+            n = 2 ** zoom
+            level: Dict[Any, list] = {}
+            for point in points:
+                key = (min(int(point["x"] * n), n - 1), min(int(point["y"] * n), n - 1))
+                level.setdefault(key, []).append(point)
+            tiles[zoom] = level
+        cluster_index.update(version=version, tiles=tiles)
+    return cluster_index["tiles"]
+
+
+def build_cluster_feature(cluster) -> bytes:
+    """Возвращает сериализованный GeoJSON-объект кластера или отдельного корпуса"""
+    if cluster["campus"] is not None:
+        return get_campus_record(cluster["campus"]).feature
+
+    lat, lon = mercator_latlon(cluster["x"], cluster["y"])
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+        "properties": {
+            "cluster": True,
+            "cluster_id": cluster["id"],
+            "point_count": cluster["count"],
+            "expansion_zoom": cluster["expansion_zoom"],
+            "categories": cluster["categories"]
+        }
+    }
+    return json.dumps(feature, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@app.get("/clusters/{z}/{x}/{y}")
+async def clusters_tile(request: Request, z: int, x: int, y: int):
+    """API с кластерами корпусов в тайле (GeoJSON): центры кластеров, их размеры и состав по категориям"""
+    check_tile(z, x, y, max_zoom=CLUSTER_MAX_ZOOM)
+
+    # Перестроение индекса после изменения данных выполняем в пуле, не блокируя цикл событий
+    if cluster_index["version"] != data_version:
+        tiles = await run_in_render_pool(get_cluster_tiles)
+    else:
+        tiles = cluster_index["tiles"]
+
+    body = feature_collection_bytes(build_cluster_feature(c) for c in tiles[z].get((x, y), []))
+
+    etag = compute_etag(body)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(
+        content=body,
+        media_type="application/geo+json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+
+# Векторные тайлы (Mapbox Vector Tile): размер сетки координат, запас по краям тайла
+# и число тайлов в памяти
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_CACHE_SIZE = int(os.environ.get("ISU_MAP_MVT_CACHE_SIZE", "1024"))
+
+# Каталог заранее подготовленных тайлов (python app.py seed-mvt); пустая строка — не использовать
+MVT_TILE_DIR = os.environ.get("ISU_MAP_MVT_DIR", "")
+
+# Кэш векторных тайлов: {(версия данных, z, x, y): байты тайла}
+mvt_cache: "OrderedDict[Any, bytes]" = OrderedDict()
+
+
+def pb_varint(value: int) -> bytes:
+    """
+    Кодирует целое неотрицательное число в формате varint протокола protobuf
+
+    Raises:
+        ValueError: Если число отрицательное (знаковые значения кодируются через zigzag)
+    """
+    if value < 0:
+        raise ValueError(f"varint не кодирует отрицательные числа: {value}")
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def pb_field(number: int, wire_type: int, payload: bytes) -> bytes:
+    """Кодирует поле protobuf: ключ и значение (для wire_type 2 — с длиной)"""
+    key = pb_varint((number << 3) | wire_type)
+    if wire_type == 2:
+        return key + pb_varint(len(payload)) + payload
+    return key + payload
+
+
+def pb_packed(number: int, values) -> bytes:
+    """Кодирует упакованное повторяющееся поле целых чисел"""
+    return pb_field(number, 2, b"".join(pb_varint(v) for v in values))
+
+
+def zigzag(value: int) -> int:
+    """Отображает целое со знаком в беззнаковое (zigzag-кодирование)"""
+    return (value << 1) ^ (value >> 63)
+
+
+def encode_mvt(z: int, x: int, y: int, campuses) -> bytes:
+    """
+    Кодирует корпуса в векторный тайл со слоем "campuses"
+
+    Каждый корпус — точка с атрибутами id и category; id корпуса также
+    записывается как идентификатор объекта.
+
+    Returns:
+        bytes: Тайл в формате Mapbox Vector Tile 2.1
+    """
+    n = 2 ** z
+    keys = ["id", "category"]
+    values: List[Any] = []
+    value_index: Dict[Any, int] = {}
+
+    def value_ref(value):
+        if (type(value), value) not in value_index:
+            value_index[(type(value), value)] = len(values)
+            values.append(value)
+        return value_index[(type(value), value)]
+
+    features = b""
+    for campus in campuses:
+        mx, my = mercator_xy(campus["lat"], campus["lon"])
+        px = round((mx * n - x) * MVT_EXTENT)
+        py = round((my * n - y) * MVT_EXTENT)
+        tags = [0, value_ref(int(campus["id"])), 1, value_ref(campus["category"])]
+        feature = (
+            pb_field(1, 0, pb_varint(int(campus["id"])))
+            + pb_packed(2, tags)
+            + pb_field(3, 0, pb_varint(1))  # POINT
+            + pb_packed(4, [(1 & 0x7) | (1 << 3), zigzag(px), zigzag(py)])  # MoveTo(1)
+        )
+        features += pb_field(2, 2, feature)
+
+    encoded_values = b""
+    for value in values:
+        if isinstance(value, str):
+            encoded_values += pb_field(4, 2, pb_field(1, 2, value.encode("utf-8")))
+        else:
+            encoded_values += pb_field(4, 2, pb_field(5, 0, pb_varint(value)))
+
+    layer = (
+        pb_field(15, 0, pb_varint(2))
+        + pb_field(1, 2, b"campuses")
+        + features
+        + b"".join(pb_field(3, 2, key.encode("utf-8")) for key in keys)
+        + encoded_values
+        + pb_field(5, 0, pb_varint(MVT_EXTENT))
+    )
+    return pb_field(3, 2, layer)
+
+
+def mvt_tile_path(directory: str, version: str, z: int, x: int, y: int) -> str:
+    """Путь к заранее подготовленному тайлу (тайлы разных версий данных не смешиваются)"""
+    return os.path.join(directory, version, str(z), str(x), f"{y}.mvt")
+
+
+def build_mvt_tile(z: int, x: int, y: int) -> bytes:
+    """Кодирует векторный тайл с корпусами, попадающими в тайл с учетом запаса по краям"""
+    min_lon, min_lat, max_lon, max_lat = tile_bounds(z, x, y)
+    pad_lon = (max_lon - min_lon) * MVT_BUFFER / MVT_EXTENT
+    pad_lat = (max_lat - min_lat) * MVT_BUFFER / MVT_EXTENT
+    campuses = query_bbox(min_lon - pad_lon, min_lat - pad_lat, max_lon + pad_lon, max_lat + pad_lat)
+    return encode_mvt(z, x, y, campuses)
+
+
+def get_mvt_tile(z: int, x: int, y: int) -> bytes:
+    """
+    Возвращает векторный тайл: из памяти, из каталога подготовленных тайлов или кодируя заново
+
+    Returns:
+        bytes: Тайл в формате Mapbox Vector Tile
+    """
+    key = (data_version, z, x, y)
+    tile = mvt_cache.get(key)
+    if tile is not None:
+        mvt_cache.move_to_end(key)
+        return tile
+
+    tile = None
+    if MVT_TILE_DIR:
+        try:
+            with open(mvt_tile_path(MVT_TILE_DIR, data_version, z, x, y), "rb") as f:
+                tile = f.read()
+        except OSError:
+            pass
+    if tile is None:
+        tile = build_mvt_tile(z, x, y)
+
+    mvt_cache[key] = tile
+    while len(mvt_cache) > MVT_CACHE_SIZE:
+        mvt_cache.popitem(last=False)
+    return tile
+
+
+def campus_tile_range(z: int):
+    """Возвращает диапазон тайлов масштаба z, покрывающий все корпуса: (min_x, min_y, max_x, max_y)"""
+    n = 2 ** z
+    lats = [campus["lat"] for campus in campus_data]
+    lons = [campus["lon"] for campus in campus_data]
+    min_x, max_y = (int(v * n) for v in mercator_xy(min(lats), min(lons)))
+    max_x, min_y = (int(v * n) for v in mercator_xy(max(lats), max(lons)))
+    return min_x, min_y, min(max_x, n - 1), min(max_y, n - 1)
+
+
+def seed_mvt_tiles(min_zoom: int, max_zoom: int, directory: str) -> int:
+    """
+    Заранее кодирует векторные тайлы области корпусов и записывает их на диск
+
+    Returns:
+        int: Число записанных тайлов
+    """
+    written = 0
+    for z in range(min_zoom, max_zoom + 1):
+        min_x, min_y, max_x, max_y = campus_tile_range(z)
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                path = mvt_tile_path(directory, data_version, z, x, y)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(build_mvt_tile(z, x, y))
+                os.replace(tmp_path, path)
+                written += 1
+    return written
+
+
+@app.get("/tiles/{z}/{x}/{y}.mvt")
+async def vector_tile(request: Request, z: int, x: int, y: int):
+    """API с векторными тайлами (MVT): корпуса как точки с атрибутами id и category"""
+    check_tile(z, x, y)
+
+    tile = get_mvt_tile(z, x, y)
+    etag = compute_etag(tile)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+
+# Слои подложки, которые можно получать через локальный прокси тайлов.
+# Адреса берутся из xyzservices (зависимость folium); запасные шаблоны нужны, если его нет.
+BASE_LAYERS = {
+    "osm": {
+        "title": "OpenStreetMap",
+        "provider": "OpenStreetMap.Mapnik",
+        "url": "https://tile.openstreetmap.org/{z}/{x}/{y}.png",
+        "attribution": '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+    },
+    "carto-dark": {
+        "title": "Тёмная карта",
+        "provider": "CartoDB.DarkMatter",
+        "url": "https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}.png",
+        "attribution": '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors '
+                       '&copy; <a href="https://carto.com/attributions">CARTO</a>'
+    },
+    "carto-light": {
+        "title": "Светлая карта",
+        "provider": "CartoDB.Positron",
+        "url": "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png",
+        "attribution": '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors '
+                       '&copy; <a href="https://carto.com/attributions">CARTO</a>'
+    },
+    "terrain": {
+        "title": "Рельеф",
+        "provider": "Stadia.StamenTerrain",
+        "url": "https://tiles.stadiamaps.com/tiles/stamen_terrain/{z}/{x}/{y}.png",
+        "attribution": '&copy; <a href="https://www.stadiamaps.com/">Stadia Maps</a> '
+                       '&copy; <a href="https://www.stamen.com/">Stamen Design</a> '
+                       '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+    },
+    "watercolor": {
+        "title": "Акварель",
+        "provider": "Stadia.StamenWatercolor",
+        "url": "https://tiles.stadiamaps.com/tiles/stamen_watercolor/{z}/{x}/{y}.jpg",
+        "attribution": '&copy; <a href="https://www.stadiamaps.com/">Stadia Maps</a> '
+                       '&copy; <a href="https://www.stamen.com/">Stamen Design</a> '
+                       '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+    }
+}
+
+# Отдавать подложку через локальный прокси (1) или напрямую с серверов тайлов (0)
+TILE_PROXY = os.environ.get("ISU_MAP_TILE_PROXY", "0") == "1"
+
+# Максимальный масштаб, до которого прокси запрашивает тайлы у серверов подложки
+TILE_PROXY_MAX_ZOOM = int(os.environ.get("ISU_MAP_TILE_MAX_ZOOM", "19"))
+
+# Каталог дискового кэша тайлов подложки и его предельный размер в мегабайтах
+TILE_CACHE_DIR = os.environ.get("ISU_MAP_TILE_CACHE_DIR", "tile_cache")
+TILE_CACHE_LIMIT = int(float(os.environ.get("ISU_MAP_TILE_CACHE_MB", "256")) * 1024 * 1024)
+
+# Параметры загрузки тайлов с серверов подложки
+TILE_FETCH_WORKERS = int(os.environ.get("ISU_MAP_TILE_FETCH_WORKERS", "8"))
+TILE_FETCH_TIMEOUT = float(os.environ.get("ISU_MAP_TILE_FETCH_TIMEOUT", "10"))
+TILE_USER_AGENT = os.environ.get("ISU_MAP_TILE_USER_AGENT", "isu-campus-map/1.0 (tile proxy)")
+
+# Загрузка тайлов ждет сети, поэтому идет в отдельном пуле и не занимает пул отрисовки
+tile_fetch_executor = ThreadPoolExecutor(max_workers=TILE_FETCH_WORKERS, thread_name_prefix="tile-fetch")
+
+# Дисковый кэш: путь к файлу -> размер в байтах, от давно использованных к недавним
+tile_cache_index: "OrderedDict[str, int]" = OrderedDict()
+tile_cache_state = {"bytes": 0, "hits": 0, "misses": 0, "evicted": 0}
+tile_cache_lock = threading.Lock()
+
+# Загрузки тайлов, которые уже идут; повторные запросы того же тайла ждут их
+pending_tiles: Dict[Any, Future] = {}
+pending_tiles_lock = threading.Lock()
+
+
+def tile_provider(layer: str):
+    """Возвращает описание слоя из xyzservices или None, если пакет недоступен"""
+    if xyz is None:
+        return None
+    try:
+        return xyz.query_name(BASE_LAYERS[layer]["provider"])
+    except ValueError:
+        return None
+
+
+def tile_url_template(layer: str) -> str:
+    """
+    Шаблон адреса тайлов слоя с подстановками {s}, {z}, {x}, {y}
+
+    Адрес можно переопределить переменной окружения ISU_MAP_TILE_URL_<СЛОЙ>
+    (например, ISU_MAP_TILE_URL_CARTO_DARK) — для ключа доступа или локального сервера тайлов.
+    """
+    override = os.environ.get("ISU_MAP_TILE_URL_" + layer.upper().replace("-", "_"))
+    if override:
+        return override
+    provider = tile_provider(layer)
+    if provider is not None:
+        return provider.build_url(fill_subdomain=False)
+    return BASE_LAYERS[layer]["url"]
+
+
+def tile_attribution(layer: str) -> str:
+    """HTML-атрибуция слоя подложки"""
+    provider = tile_provider(layer)
+    if provider is not None and provider.get("html_attribution"):
+        return provider["html_attribution"]
+    return BASE_LAYERS[layer]["attribution"]
+
+
+def tile_upstream_url(layer: str, z: int, x: int, y: int) -> str:
+    """Адрес тайла на сервере подложки; поддомен выбирается по координатам тайла"""
+    url = tile_url_template(layer)
+    if "{s}" in url:
+        provider = tile_provider(layer)
+        subdomains = (provider.get("subdomains") if provider is not None else None) or "abc"
+        url = url.replace("{s}", subdomains[(x + y) % len(subdomains)])
+    return url.replace("{r}", "").replace("{z}", str(z)).replace("{x}", str(x)).replace("{y}", str(y))
+
+
+def tile_cache_path(layer: str, z: int, x: int, y: int) -> str:
+    """Путь к тайлу в дисковом кэше"""
+    return os.path.join(TILE_CACHE_DIR, layer, str(z), str(x), str(y))
+
+
+def load_tile_cache_index():
+    """Заполняет индекс дискового кэша по файлам в каталоге, от старых к новым"""
+    entries = []
+    for root, _, files in os.walk(TILE_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(".tmp"):
+                # Остаток прерванной записи
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, path, stat.st_size))
+
+    with tile_cache_lock:
+        tile_cache_index.clear()
+        for _, path, size in sorted(entries):
+            tile_cache_index[path] = size
+        tile_cache_state["bytes"] = sum(tile_cache_index.values())
+
+
+def read_cached_tile(layer: str, z: int, x: int, y: int) -> Optional[bytes]:
+    """Читает тайл из дискового кэша и отмечает его как недавно использованный"""
+    path = tile_cache_path(layer, z, x, y)
+    with tile_cache_lock:
+        if path not in tile_cache_index:
+            tile_cache_state["misses"] += 1
+            return None
+        tile_cache_index.move_to_end(path)
+        tile_cache_state["hits"] += 1
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # Время изменения хранит порядок вытеснения между перезапусками
+        os.utime(path)
+    except OSError:
+        # Файл удалили снаружи — забываем о нем
+        with tile_cache_lock:
+            tile_cache_state["bytes"] -= tile_cache_index.pop(path, 0)
+        return None
+    return data
+
+
+def store_cached_tile(layer: str, z: int, x: int, y: int, data: bytes):
+    """Записывает тайл в дисковый кэш и вытесняет давно не использованные тайлы сверх лимита"""
+    path = tile_cache_path(layer, z, x, y)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    evicted = []
+    with tile_cache_lock:
+        tile_cache_state["bytes"] += len(data) - tile_cache_index.pop(path, 0)
+        tile_cache_index[path] = len(data)
+        while tile_cache_state["bytes"] > TILE_CACHE_LIMIT and len(tile_cache_index) > 1:
+            old_path, size = tile_cache_index.popitem(last=False)
+            tile_cache_state["bytes"] -= size
+            tile_cache_state["evicted"] += 1
+            evicted.append(old_path)
+
+    for old_path in evicted:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+
+def load_tile(layer: str, z: int, x: int, y: int) -> bytes:
+    """
+    Возвращает тайл подложки из дискового кэша или загружает его с сервера подложки
+
+    Raises:
+        urllib.error.HTTPError: Сервер подложки ответил ошибкой
+        OSError: Сервер подложки недоступен
+    """
+    data = read_cached_tile(layer, z, x, y)
+    if data is not None:
+        return data
+
+    request = urllib.request.Request(tile_upstream_url(layer, z, x, y), headers={"User-Agent": TILE_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=TILE_FETCH_TIMEOUT) as response:
+        data = response.read()
+    store_cached_tile(layer, z, x, y, data)
+    return data
+
+
+def submit_tile_load(layer: str, z: int, x: int, y: int) -> Future:
+    """Запускает загрузку тайла; одновременные запросы одного тайла получают общую загрузку"""
+    key = (layer, z, x, y)
+    with pending_tiles_lock:
+        future = pending_tiles.get(key)
+        if future is None:
+            future = tile_fetch_executor.submit(load_tile, layer, z, x, y)
+            pending_tiles[key] = future
+            future.add_done_callback(lambda _: pending_tiles.pop(key, None))
+    return future
+
+
+def tile_media_type(data: bytes) -> str:
+    """Определяет формат растрового тайла по сигнатуре"""
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+def seed_base_tiles(layers, min_zoom: int, max_zoom: int) -> Dict[str, int]:
+    """
+    Заранее загружает в дисковый кэш тайлы подложки вокруг корпусов (с запасом в один тайл)
+
+    Returns:
+        dict: Число тайлов по исходу — "loaded" и "failed"
+    """
+    futures = []
+    for layer in layers:
+        for z in range(min_zoom, max_zoom + 1):
+            n = 2 ** z
+            min_x, min_y, max_x, max_y = campus_tile_range(z)
+            for x in range(max(min_x - 1, 0), min(max_x + 1, n - 1) + 1):
+                for y in range(max(min_y - 1, 0), min(max_y + 1, n - 1) + 1):
+                    futures.append(submit_tile_load(layer, z, x, y))
+
+    result = {"loaded": 0, "failed": 0}
+    for future in futures:
+        try:
+            future.result()
+            result["loaded"] += 1
+        except (urllib.error.URLError, OSError):
+            result["failed"] += 1
+    return result
+
+
+@app.get("/tiles/{layer}/{z}/{x}/{y}.png")
+async def base_tile(layer: str, z: int, x: int, y: int):
+    """Прокси тайлов подложки с дисковым кэшем (формат тайла — как у сервера подложки)"""
+    if layer not in BASE_LAYERS:
+        raise HTTPException(status_code=404, detail="Слой подложки не найден")
+    check_tile(z, x, y, max_zoom=TILE_PROXY_MAX_ZOOM)
+
+    try:
+        data = await asyncio.shield(asyncio.wrap_future(submit_tile_load(layer, z, x, y)))
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            raise HTTPException(status_code=404, detail="Тайл не найден")
+        raise HTTPException(status_code=502, detail=f"Сервер подложки ответил {e.code}")
+    except (urllib.error.URLError, OSError):
+        raise HTTPException(status_code=502, detail="Сервер подложки недоступен")
+
+    return Response(
+        content=data,
+        media_type=tile_media_type(data),
+        headers={"Cache-Control": "public, max-age=604800"}
+    )
+
+
+@app.get("/metrics/tiles")
+async def tile_metrics():
+    """Состояние дискового кэша тайлов подложки"""
+    return {
+        "proxy": TILE_PROXY,
+        "cached_tiles": len(tile_cache_index),
+        "cache_bytes": tile_cache_state["bytes"],
+        "cache_limit_bytes": TILE_CACHE_LIMIT,
+        "hits": tile_cache_state["hits"],
+        "misses": tile_cache_state["misses"],
+        "evicted": tile_cache_state["evicted"],
+        "loading": len(pending_tiles)
+    }
+
+
+def diff_campuses(old_data, new_data):
+    """
+    Сравнивает два списка корпусов по id
+
+    Returns:
+        tuple: (прежние записи удаленных и измененных корпусов, новые записи добавленных
+            и измененных корпусов, id затронутых корпусов, затронутые категории)
+    """
+    old_by_id = {campus["id"]: campus for campus in old_data}
+    new_by_id = {campus["id"]: campus for campus in new_data}
+
+    removed = [campus for cid, campus in old_by_id.items() if new_by_id.get(cid) != campus]
+    added = [campus for cid, campus in new_by_id.items() if old_by_id.get(cid) != campus]
+    affected_ids = {campus["id"] for campus in removed + added}
+    categories = {campus["category"] for campus in removed + added}
+    return removed, added, affected_ids, categories
+
+
+def prepare_dataset_update(new_data):
+    """
+    Готовит производные структуры для новых данных, не изменяя текущие (копирование при записи)
+
+    Структуры, построенные для текущей версии, обновляются только по затронутым
+    корпусам; еще не построенные будут построены лениво при первом обращении.
+
+    Args:
+        new_data (list): Новые записи о корпусах
+
+    Returns:
+        dict: Новые данные, версия и обновленные структуры или None, если данные не изменились
+    """
+    base_version, old_data = dataset_snapshot()
+    version = compute_data_version(new_data)
+    if version == base_version:
+        return None
+
+    removed, added, affected_ids, categories = diff_campuses(old_data, new_data)
+    update = {
+        "base_version": base_version,
+        "version": version,
+        "data": new_data,
+        "categories": categories,
+        "changed": len(affected_ids)
+    }
+
+    store = dict(campus_store)
+    if store["version"] == base_version:
+        records = dict(store["records"])
+        for campus in removed:
+            records.pop(campus["id"], None)
+        for campus in added:
+            records[campus["id"]] = CampusRecord(campus)
+        update["campus_store"] = {"version": version, "records": records}
+
+    spatial = dict(spatial_index)
+    if spatial["version"] == base_version:
+        update["spatial_index"] = {"version": version, "cells": update_spatial_cells(spatial["cells"], removed, added)}
+
+    search = dict(search_index)
+    if search.get("version") == base_version:
+        update["search_index"] = update_search_index(search, removed, added, version)
+
+    suggestions = dict(suggest_index)
+    if suggestions.get("version") == base_version:
+        update["suggest_index"] = update_suggest_index(suggestions, affected_ids, added, version)
+
+    return update
+
+
+def carry_over_cache(cache, base_version, version, categories):
+    """
+    Переносит в новую версию записи кэша, которые не зависят от изменившихся категорий
+
+    Ключи кэша имеют вид (версия, категории[, ленивый режим, ...]); карта в ленивом
+    режиме не содержит маркеров и переносится всегда.
+    """
+    for key, value in list(cache.items()):
+        if key[0] != base_version:
+            continue
+        lazy = len(key) > 2 and key[2]
+        if lazy or not key[1] & categories:
+            cache[(version, *key[1:])] = value
+
+
+def apply_dataset_update(update):
+    """
+    Атомарно подменяет данные и производные структуры подготовленными
+
+    Выполняется в цикле событий без await, поэтому обработчики запросов видят
+    либо старое, либо новое состояние целиком.
+
+    Returns:
+        bool: False, если с момента подготовки данные успели смениться
+    """
+    global campus_data, data_version
+
+    if update["base_version"] != data_version:
+        return False
+
+    with dataset_lock:
+        campus_data = update["data"]
+        data_version = update["version"]
+
+    for name, structure in (("campus_store", campus_store), ("spatial_index", spatial_index),
+                            ("search_index", search_index), ("suggest_index", suggest_index)):
+        if name in update:
+            structure.update(update[name])
+
+    with map_cache_lock:
+        carry_over_cache(map_cache, update["base_version"], update["version"], update["categories"])
+    carry_over_cache(geojson_cache, update["base_version"], update["version"], update["categories"])
+    return True
+
+
+async def reload_campus_data(force: bool = False) -> bool:
+    """
+    Перечитывает файл данных, если он изменился, и применяет изменения без перезапуска
+
+    Чтение файла и подготовка структур выполняются в пуле потоков. Файл с
+    ошибкой не перечитывается, пока не изменится снова.
+
+    Returns:
+        bool: True, если данные были заменены
+
+    Raises:
+        ValueError: Если файл данных некорректен
+        Exception: Ошибки подготовки производных структур
+    """
+    stamp = data_file_stamp(CAMPUS_DATA_PATH)
+    if not force and stamp in (data_file_state["stamp"], data_file_state["failed"]):
+        return False
+
+    try:
+        new_data = await run_in_render_pool(load_campus_file, CAMPUS_DATA_PATH)
+        update = await run_in_render_pool(prepare_dataset_update, new_data)
+    except HTTPException:
+        # Пул отрисовки перегружен — файл исправен, повторим на следующей проверке
+        raise
+    except Exception:
+        # Файл, который не удалось прочитать или подготовить, не перечитывается до изменения
+        data_file_state["failed"] = stamp
+        raise
+    if update is not None and not apply_dataset_update(update):
+        # Данные сменились во время подготовки — повторим на следующей проверке
+        return False
+
+    data_file_state["stamp"] = stamp
+    data_file_state["failed"] = None
+    if update is not None:
+        print(f"Данные о корпусах обновлены: версия {update['version']}, изменено записей: {update['changed']}")
+    return update is not None
+
+
+async def watch_campus_data():
+    """Периодически проверяет файл данных о корпусах на изменения"""
+    last_error = None
+    while True:
+        await asyncio.sleep(DATA_CHECK_INTERVAL)
+        try:
+            await reload_campus_data()
+            last_error = None
+        except Exception as exc:
+            # Недописанный или некорректный файл не должен останавливать наблюдение;
+            # одна и та же ошибка пишется в журнал один раз
+            if str(exc) != last_error:
+                print(f"Не удалось перечитать {CAMPUS_DATA_PATH}: {exc}")
+            last_error = str(exc)
+
+
+@app.middleware("http")
+async def add_data_version_header(request: Request, call_next):
+    """Сообщает браузеру версию данных о корпусах, чтобы он сбрасывал устаревшие кэши страницы"""
+    response = await call_next(request)
+    response.headers["X-Data-Version"] = data_version
+    return response
 
 
 # Главная страница
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Главная страница с картой"""
-    # Создаем файлы перед рендерингом страницы
-    create_icon_files()
-    create_css_files()
-    create_js_files()
-    create_html_template()
-
-    # Создаем карту
-    folium_map = create_map()
+    # Берем карту из кэша (отрисовывается в пуле потоков только при изменении данных)
+    folium_map = await get_rendered_map_async()
 
     # Рендерим шаблон
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "index.html",
         {
             "request": request,
-            "folium_map": folium_map,
-            "category_colors": category_colors
+            "folium_css": folium_map["css"],
+            "folium_map": folium_map["html"],
+            "folium_js": folium_map["js"],
+            "category_colors": category_colors,
+            "data_version": data_version
         }
     )
 
+    # Повторным посетителям с актуальной копией страницы отвечаем 304
+    etag = compute_etag(response.body)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 
 # Функция для генерации готового HTML для самостоятельного использования
 @app.get("/export", response_class=HTMLResponse)
-async def export_html():
-    """Создает автономный HTML-файл с картой"""
-    # Создаем карту
-    folium_map = create_map()
+async def export_html(request: Request, minify: bool = False):
+    """
+    Создает автономный HTML-файл с картой
+
+    Первая выгрузка отдается потоком по частям; повторные — из кэша, сжатыми
+    в brotli или gzip в зависимости от Accept-Encoding.
+    """
+    key = export_cache_key(minify)
+    artifact = export_cache.get(key)
+    if artifact is None:
+        # Обе задачи ставятся в пул до начала ответа, чтобы перегрузка пула
+        # вернулась настоящим кодом 503, а не оборванной страницей
+        head_future = submit_render(export_head_chunk, minify)
+        body_future = submit_render(export_body_chunks, minify)
+        return StreamingResponse(stream_export(key, head_future, body_future), media_type="text/html; charset=utf-8")
+
+    encoding = negotiate_encoding(request, EXPORT_ENCODINGS)
+    etag = f'"{artifact["etag"].strip(chr(34))}-{encoding}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=artifact[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+
+@app.get("/metrics/render")
+async def render_metrics():
+    """API с метриками пула отрисовки (глубина очереди, активные задачи, счетчики)"""
+    with render_stats_lock:
+        stats = dict(render_stats)
+    return {
+        **stats,
+        "workers": RENDER_WORKERS,
+        "queue_limit": RENDER_QUEUE_LIMIT,
+        "pending_map_renders": len(pending_renders),
+        "cached_maps": len(map_cache)
+    }
+
 
-    # Создаем HTML-код с встроенными CSS и JavaScript
-    with open(os.path.join(static_dir, "style.css"), 'r') as f:
-        css = f.read()
+# Кэш готовых файлов экспорта: {(версия данных, версии ресурсов, сжатие): {кодировка: байты, "etag": ETag}}
+export_cache: Dict[Any, Dict[str, Any]] = {}
 
-    with open(os.path.join(static_dir, "dark-theme.css"), 'r') as f:
-        dark_css = f.read()
+# Кодировки ответа /export в порядке предпочтения
+EXPORT_ENCODINGS = ("br", "gzip", "identity") if brotli is not None else ("gzip", "identity")
 
-    with open(os.path.join(static_dir, "main.js"), 'r') as f:
-        js = f.read()
+
+def minify_text(text: str, kind: str) -> str:
+    """
+    Облегченная минификация: для CSS убирает комментарии и лишние пробелы,
+    для HTML и JavaScript — отступы и пустые строки (переводы строк сохраняются)
+    """
+    if kind == "css":
+        text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+        text = re.sub(r"\s+", " ", text)
+        return re.sub(r"\s*([{};,>])\s*", r"\1", text).strip()
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def export_head_chunk(minify: bool = False) -> str:
+    """Начало автономной страницы: встроенные стили и боковая панель (не зависит от карты)"""
+    css = asset_contents[os.path.normpath(os.path.join(static_dir, "style.css"))]
+    dark_css = asset_contents[os.path.normpath(os.path.join(static_dir, "dark-theme.css"))]
+    if minify:
+        css, dark_css = minify_text(css, "css"), minify_text(dark_css, "css")
 
     html = f"""<!DOCTYPE html>
 <html lang="ru">
@@ -953,7 +3116,8 @@ async def export_html():
             <h3>Карта корпусов ИГУ</h3>
 
             <div class="search-container">
-                <input type="text" id="search-input" placeholder="Поиск корпуса...">
+                <input type="text" id="search-input" placeholder="Поиск корпуса..." list="search-suggestions" autocomplete="off">
+                <datalist id="search-suggestions"></datalist>
                 <button id="search-button" class="btn">Найти</button>
             </div>
 
@@ -984,74 +3148,119 @@ async def export_html():
             <div id="info-content"></div>
         </div>
 
+"""
+    return minify_text(html, "html") if minify else html
+
+
+def export_map_chunk(folium_map, minify: bool = False) -> str:
+    """Карта автономной страницы: стили и скрипты Folium и контейнер карты"""
+    html = f"""        {folium_map["css"]}
         <div id="map">
-            {folium_map}
+            {folium_map["html"]}
         </div>
     </div>
 
-    <script>
+"""
+    return minify_text(html, "html") if minify else html
+
+
+def export_scripts_chunk(folium_map, minify: bool = False) -> str:
+    """Скрипты автономной страницы: main.js, данные о корпусах и скрипт карты"""
+    js = asset_contents[os.path.normpath(os.path.join(static_dir, "main.js"))]
+    details = json.dumps(
+        {record.id: record.details.decode("utf-8") for record in get_campus_records().values()},
+        ensure_ascii=False
+    ).replace("</", "<\\/")
+
+    html = f"""    <script>
         {js}
 
-        // Дополнительный код для обработки информации о корпусах
-        const campusData = {json.dumps(campus_data)};
+        // Автономная страница показывает заранее подготовленную информацию о корпусах
+        const campusDetails = {details};
 
         function showDetails(campusId) {{
-            const campus = campusData.find(c => c.id === campusId);
-            if (campus) {{
-                const infoPanel = document.getElementById('info-panel');
-                const infoTitle = document.getElementById('info-title');
-                const infoContent = document.getElementById('info-content');
-
-                infoTitle.textContent = campus.name;
-
-                let content = `
-                    <p><strong>Адрес:</strong> ${{campus.address}}</p>
-                    <p><strong>Категория:</strong> ${{campus.category.charAt(0).toUpperCase() + campus.category.slice(1)}}</p>
-                    <p><strong>Телефон:</strong> ${{campus.phone}}</p>
-                    <p><strong>Год постройки:</strong> ${{campus.year_built}}</p>
-                    <p><strong>Количество этажей:</strong> ${{campus.floors}}</p>
-                `;
-
-                if (campus.students_capacity) {{
-                    content += `<p><strong>Вместимость студентов:</strong> ${{campus.students_capacity}}</p>`;
-                }}
-
-                if (campus.capacity) {{
-                    content += `<p><strong>Вместимость:</strong> ${{campus.capacity}}</p>`;
-                }}
-
-                if (campus.faculties) {{
-                    content += `<p><strong>Факультеты:</strong> ${{campus.faculties.join(', ')}}</p>`;
-                }}
-
-                if (campus.facilities) {{
-                    content += `<p><strong>Удобства:</strong> ${{campus.facilities.join(', ')}}</p>`;
-                }}
-
-                if (campus.services) {{
-                    content += `<p><strong>Услуги:</strong> ${{campus.services.join(', ')}}</p>`;
-                }}
-
-                if (campus.meal_times) {{
-                    content += `<p><strong>Время приёма пищи:</strong></p><ul>`;
-                    for (const [meal, time] of Object.entries(campus.meal_times)) {{
-                        content += `<li>${{meal}}: ${{time}}</li>`;
-                    }}
-                    content += `</ul>`;
-                }}
-
-                content += `<p><a href="${{campus.website}}" target="_blank">Официальный сайт</a></p>`;
-
-                infoContent.innerHTML = content;
-                infoPanel.style.display = 'block';
+            if (campusDetails[campusId]) {{
+                showDetailsHtml(campusDetails[campusId]);
             }}
         }}
     </script>
+    {folium_map["js"]}
 </body>
 </html>
     """
+    return minify_text(html, "html") if minify else html
 
-    return html
+
+def export_body_chunks(minify: bool = False):
+    """
+    Отрисовывает карту автономной страницы (или берет ее из кэша) и собирает
+    оставшиеся части страницы; выполняется в пуле отрисовки
+
+    Returns:
+        list: Части страницы после начала документа (bytes)
+    """
+    folium_map = get_rendered_map(lazy=False, standalone=True)
+    return [
+        export_map_chunk(folium_map, minify).encode("utf-8"),
+        export_scripts_chunk(folium_map, minify).encode("utf-8")
+    ]
+
+
+def export_cache_key(minify: bool):
+    """Ключ кэша экспорта: версия данных, версии статических файлов и режим минификации"""
+    return data_version, tuple(sorted(asset_hashes.items())), minify
+
+
+def store_export_artifact(key, body: bytes):
+    """Сжимает готовую страницу экспорта и сохраняет ее в кэше для всех поддерживаемых кодировок"""
+    artifact = {"identity": body, "gzip": gzip.compress(body, compresslevel=9), "etag": compute_etag(body)}
+    if brotli is not None:
+        artifact["br"] = brotli.compress(body, quality=11)
+
+    for stale_key in [k for k in export_cache if k[0] != key[0]]:
+        export_cache.pop(stale_key, None)
+    export_cache[key] = artifact
+    return artifact
+
+
+def negotiate_encoding(request: Request, available) -> str:
+    """Выбирает кодировку ответа по заголовку Accept-Encoding из доступных"""
+    accepted = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+
+    for encoding in available:
+        if encoding == "identity" or accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+async def stream_export(key, head_future, body_future):
+    """
+    Отдает автономную страницу по частям: начало страницы уходит, как только
+    готово, пока карта еще отрисовывается в пуле; собранная страница затем
+    сжимается в фоне
+    """
+    chunks = [(await asyncio.wrap_future(head_future)).encode("utf-8")]
+    yield chunks[0]
+
+    for chunk in await asyncio.wrap_future(body_future):
+        chunks.append(chunk)
+        yield chunk
+
+    try:
+        submit_render(store_export_artifact, key, b"".join(chunks))
+    except HTTPException:
+        # Пул перегружен — сжатую копию подготовит один из следующих запросов
+        pass
 
 
 def generate_filter_html():
@@ -1083,8 +3292,50 @@ def generate_legend_html():
     return html
 
 
+# Статические файлы генерируются один раз при запуске (неизмененные файлы не перезаписываются);
+# на этапе сборки их можно сгенерировать заранее командой: python app.py build-assets
+build_static_assets()
+
+templates.env.globals["asset_url"] = asset_url
+
+# Готовые фрагменты и GeoJSON-объекты корпусов строятся заранее для текущей версии данных
+get_campus_records()
+
+# Тайлы подложки, загруженные при прошлых запусках, снова доступны прокси
+load_tile_cache_index()
+
+
 # Запуск приложения
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build-assets":
+        # Файлы уже сгенерированы при импорте модуля
+        print("Статические файлы сгенерированы:")
+        for path, content_hash in sorted(asset_hashes.items()):
+            print(f"  {path} ({content_hash})")
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "seed-mvt":
+        # python app.py seed-mvt [МИН_МАСШТАБ-МАКС_МАСШТАБ] [КАТАЛОГ]
+        zoom_range = sys.argv[2] if len(sys.argv) > 2 else "10-16"
+        directory = sys.argv[3] if len(sys.argv) > 3 else (MVT_TILE_DIR or "tiles")
+        min_zoom, _, max_zoom = zoom_range.partition("-")
+        count = seed_mvt_tiles(int(min_zoom), int(max_zoom or min_zoom), directory)
+        print(f"Записано векторных тайлов: {count} в {os.path.join(directory, data_version)}")
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "seed-tiles":
+        # python app.py seed-tiles [СЛОЙ,СЛОЙ...] [МИН_МАСШТАБ-МАКС_МАСШТАБ]
+        layers = sys.argv[2].split(",") if len(sys.argv) > 2 else ["osm"]
+        zoom_range = sys.argv[3] if len(sys.argv) > 3 else "12-17"
+        unknown = [layer for layer in layers if layer not in BASE_LAYERS]
+        if unknown:
+            print(f"Неизвестные слои: {', '.join(unknown)}; доступны: {', '.join(BASE_LAYERS)}")
+            sys.exit(1)
+        min_zoom, _, max_zoom = zoom_range.partition("-")
+        result = seed_base_tiles(layers, int(min_zoom), int(max_zoom or min_zoom))
+        print(f"Тайлов подложки в кэше {TILE_CACHE_DIR}: загружено {result['loaded']}, ошибок {result['failed']}")
+        sys.exit(1 if result["failed"] else 0)
+
     import uvicorn
 
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -29,24 +29,70 @@ document.addEventListener('DOMContentLoaded', function() {
         this.textContent = sidebar.classList.contains('hide-sidebar') ? '>' : '<';
     });
 
-    // Фильтрация категорий
+    // Фильтрация категорий: сервер возвращает GeoJSON, обновляется только слой маркеров
     const categoryFilters = document.querySelectorAll('.category-filter');
+    const filterCache = new Map();
+    let filterController = null;
 
-    categoryFilters.forEach(filter => {
-        filter.addEventListener('change', function() {
-            const category = this.value;
-            const isChecked = this.checked;
+    function applyCategoryFilter() {
+        // В ленивом режиме маркеры уже загружены по тайлам — фильтруем их в браузере
+        if (['lazy', 'clustered'].includes(window.campusMarkerMode)) {
+            renderViewportMarkers();
+            return;
+        }
 
-            // Отправляем запрос на сервер для фильтрации
-            fetch(`/filter?category=${category}&show=${isChecked}`)
-                .then(response => response.json())
-                .then(data => {
-                    // Перезагружаем страницу для обновления карты
-                    window.location.reload();
-                });
+        const params = new URLSearchParams();
+        categoryFilters.forEach(filter => {
+            if (filter.checked) {
+                params.append('category', filter.value);
+            }
         });
+        const query = params.toString();
+
+        // Отменяем запрос, ответ на который уже не нужен
+        if (filterController) {
+            filterController.abort();
+            filterController = null;
+        }
+
+        if (filterCache.has(query)) {
+            renderMarkers(filterCache.get(query));
+            return;
+        }
+
+        filterController = new AbortController();
+        fetch(`/filter?${query}`, {signal: filterController.signal})
+            .then(checkDataVersion)
+            .then(response => response.json())
+            .then(data => {
+                filterCache.set(query, data);
+                renderMarkers(data);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('Ошибка фильтрации:', error);
+                }
+            });
+    }
+
+    categoryFilters.forEach(filter => {
+        filter.addEventListener('change', applyCategoryFilter);
     });
 
+    // После обновления данных на сервере загруженные слои маркеров устарели
+    onDataVersionChange(() => {
+        filterCache.clear();
+        if (!['lazy', 'clustered'].includes(window.campusMarkerMode)) {
+            applyCategoryFilter();
+        }
+    });
+
+    // Ленивая загрузка маркеров (или кластеров с сервера) видимой области
+    if (['lazy', 'clustered'].includes(window.campusMarkerMode) && window.leafletMap) {
+        window.leafletMap.on('moveend', loadViewportMarkers);
+        loadViewportMarkers();
+    }
+
     // Поиск корпусов
     const searchInput = document.getElementById('search-input');
     const searchButton = document.getElementById('search-button');
@@ -55,6 +101,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const searchTerm = searchInput.value.trim();
         if (searchTerm) {
             fetch(`/search?term=${encodeURIComponent(searchTerm)}`)
+                .then(checkDataVersion)
                 .then(response => response.json())
                 .then(data => {
                     // Если есть результаты поиска
@@ -75,6 +122,58 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Подсказки при вводе: запросы откладываются до паузы в наборе и кэшируются
+    const suggestionList = document.getElementById('search-suggestions');
+    const suggestionCache = new Map();
+    let suggestTimer = null;
+    let suggestController = null;
+    onDataVersionChange(() => suggestionCache.clear());
+
+    function showSuggestions(suggestions) {
+        suggestionList.innerHTML = '';
+        suggestions.forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.text;
+            suggestionList.appendChild(option);
+        });
+    }
+
+    searchInput.addEventListener('input', function() {
+        const prefix = this.value.trim().toLowerCase();
+        clearTimeout(suggestTimer);
+
+        if (prefix.length < 2) {
+            showSuggestions([]);
+            return;
+        }
+        if (suggestionCache.has(prefix)) {
+            showSuggestions(suggestionCache.get(prefix));
+            return;
+        }
+
+        suggestTimer = setTimeout(() => {
+            if (suggestController) {
+                suggestController.abort();
+            }
+            suggestController = new AbortController();
+
+            fetch(`/suggest?prefix=${encodeURIComponent(prefix)}&k=8`, {signal: suggestController.signal})
+                .then(checkDataVersion)
+                .then(response => response.json())
+                .then(data => {
+                    suggestionCache.set(prefix, data.suggestions);
+                    if (searchInput.value.trim().toLowerCase() === prefix) {
+                        showSuggestions(data.suggestions);
+                    }
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Ошибка загрузки подсказок:', error);
+                    }
+                });
+        }, 200);
+    });
+
     // Обработка нажатия Enter в поле поиска
     searchInput.addEventListener('keyup', function(event) {
         if (event.key === "Enter") {
@@ -93,56 +192,208 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
-// Функция для отображения детальной информации о корпусе
-function showDetails(campusId) {
-    fetch(`/campus/${campusId}`)
-        .then(response => response.json())
-        .then(campus => {
-            const infoPanel = document.getElementById('info-panel');
-            const infoTitle = document.getElementById('info-title');
-            const infoContent = document.getElementById('info-content');
-
-            infoTitle.textContent = campus.name;
-
-            let content = `
-                <p><strong>Адрес:</strong> ${campus.address}</p>
-                <p><strong>Категория:</strong> ${campus.category.charAt(0).toUpperCase() + campus.category.slice(1)}</p>
-                <p><strong>Телефон:</strong> ${campus.phone}</p>
-                <p><strong>Год постройки:</strong> ${campus.year_built}</p>
-                <p><strong>Количество этажей:</strong> ${campus.floors}</p>
-            `;
-
-            if (campus.students_capacity) {
-                content += `<p><strong>Вместимость студентов:</strong> ${campus.students_capacity}</p>`;
-            }
+// Создает маркер Leaflet для объекта GeoJSON
+function createMarker(feature) {
+    const [lon, lat] = feature.geometry.coordinates;
+    const props = feature.properties;
+    const icon = L.AwesomeMarkers.icon({
+        icon: 'info-sign',
+        iconColor: 'white',
+        markerColor: props.color,
+        prefix: 'glyphicon'
+    });
 
-            if (campus.capacity) {
-                content += `<p><strong>Вместимость:</strong> ${campus.capacity}</p>`;
-            }
+    // Leaflet выводит строку подсказки как HTML, поэтому название передается текстовым узлом
+    const tooltip = document.createElement('span');
+    tooltip.textContent = props.name;
 
-            if (campus.faculties) {
-                content += `<p><strong>Факультеты:</strong> ${campus.faculties.join(', ')}</p>`;
-            }
+    return L.marker([lat, lon], {icon: icon})
+        .bindPopup(props.popup, {maxWidth: 300})
+        .bindTooltip(tooltip);
+}
+
+// Создает значок кластера, пришедшего с сервера; щелчок приближает карту до его распада
+function createClusterMarker(feature, count) {
+    const [lon, lat] = feature.geometry.coordinates;
+    const size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+    const icon = L.divIcon({
+        html: `<div><span>${count}</span></div>`,
+        className: `marker-cluster marker-cluster-${size}`,
+        iconSize: L.point(40, 40)
+    });
+
+    return L.marker([lat, lon], {icon: icon}).on('click', () => {
+        window.leafletMap.setView([lat, lon], feature.properties.expansion_zoom);
+    });
+}
+
+// Заменяет маркеры в слое кластеризации объектами из GeoJSON
+function renderMarkers(geojson) {
+    const layer = window.campusMarkerLayer;
+    if (!layer) {
+        return;
+    }
 
-            if (campus.facilities) {
-                content += `<p><strong>Удобства:</strong> ${campus.facilities.join(', ')}</p>`;
+    layer.clearLayers();
+    layer.addLayers(geojson.features.map(createMarker));
+}
+
+// Кэш загруженных тайлов маркеров (ключ "z/x/y", порядок вставки — порядок использования)
+const TILE_CACHE_LIMIT = 256;
+const markerTileCache = new Map();
+const markerById = new Map();
+let viewportRequest = 0;
+
+// Версия данных о корпусах, для которой заполнены кэши страницы; сервер
+// сообщает текущую версию в заголовке X-Data-Version каждого ответа
+let campusDataVersion = document.querySelector('meta[name="campus-data-version"]')?.content || null;
+const dataVersionListeners = [];
+
+function onDataVersionChange(listener) {
+    dataVersionListeners.push(listener);
+}
+
+// Сбрасывает кэши маркеров и подсказок, если данные на сервере обновились
+function checkDataVersion(response) {
+    const version = response.headers.get('X-Data-Version');
+    if (version && version !== campusDataVersion) {
+        campusDataVersion = version;
+        markerTileCache.clear();
+        markerById.clear();
+        dataVersionListeners.forEach(listener => listener());
+        if (['lazy', 'clustered'].includes(window.campusMarkerMode) && window.leafletMap) {
+            loadViewportMarkers();
+        }
+    }
+    return response;
+}
+
+// Возвращает ключи тайлов ("источник/z/x/y"), покрывающих видимую область карты:
+// на малых масштабах в режиме серверной кластеризации — тайлы кластеров
+function visibleTileKeys(map) {
+    const zoom = Math.max(0, Math.round(map.getZoom()));
+    const clustered = window.campusMarkerMode === 'clustered' && zoom <= window.campusClusterMaxZoom;
+    const source = clustered ? 'clusters' : 'markers';
+    const z = clustered ? zoom : Math.min(zoom, window.campusTileMaxZoom);
+    const n = Math.pow(2, z);
+    const bounds = map.getBounds();
+    const clamp = (v, min, max) => Math.max(min, Math.min(max, v));
+    const tileX = lon => clamp(Math.floor((lon + 180) / 360 * n), 0, n - 1);
+    const tileY = lat => {
+        const rad = clamp(lat, -85.0511, 85.0511) * Math.PI / 180;
+        return clamp(Math.floor((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2 * n), 0, n - 1);
+    };
+
+    const keys = [];
+    for (let x = tileX(bounds.getWest()); x <= tileX(bounds.getEast()); x++) {
+        for (let y = tileY(bounds.getNorth()); y <= tileY(bounds.getSouth()); y++) {
+            keys.push(`${source}/${z}/${x}/${y}`);
+        }
+    }
+    return keys;
+}
+
+// Загружает недостающие тайлы видимой области и перерисовывает маркеры
+function loadViewportMarkers() {
+    const map = window.leafletMap;
+    const requestId = ++viewportRequest;
+    const keys = visibleTileKeys(map);
+
+    const pending = keys.filter(key => !markerTileCache.has(key)).map(key =>
+        fetch(`/${key}`)
+            .then(checkDataVersion)
+            .then(response => response.json())
+            .then(data => markerTileCache.set(key, data.features))
+    );
+
+    Promise.all(pending)
+        .then(() => {
+            // Обновляем порядок использования и вытесняем самые старые тайлы
+            keys.forEach(key => {
+                const features = markerTileCache.get(key);
+                markerTileCache.delete(key);
+                markerTileCache.set(key, features);
+            });
+            while (markerTileCache.size > TILE_CACHE_LIMIT) {
+                markerTileCache.delete(markerTileCache.keys().next().value);
             }
 
-            if (campus.services) {
-                content += `<p><strong>Услуги:</strong> ${campus.services.join(', ')}</p>`;
+            // Пока тайлы загружались, пользователь мог сдвинуть карту
+            if (requestId === viewportRequest) {
+                renderViewportMarkers();
             }
+        })
+        .catch(error => console.error('Ошибка загрузки маркеров:', error));
+}
+
+// Показывает маркеры выбранных категорий из тайлов видимой области
+function renderViewportMarkers() {
+    const map = window.leafletMap;
+    const layer = window.campusMarkerLayer;
+    if (!map || !layer) {
+        return;
+    }
 
-            if (campus.meal_times) {
-                content += `<p><strong>Время приёма пищи:</strong></p><ul>`;
-                for (const [meal, time] of Object.entries(campus.meal_times)) {
-                    content += `<li>${meal}: ${time}</li>`;
+    const selected = new Set(
+        Array.from(document.querySelectorAll('.category-filter:checked'), filter => filter.value)
+    );
+    const markers = new Map();
+
+    visibleTileKeys(map).forEach(key => {
+        (markerTileCache.get(key) || []).forEach(feature => {
+            const props = feature.properties;
+
+            // Размер кластера пересчитываем по выбранным категориям
+            if (props.cluster) {
+                const count = Object.entries(props.categories)
+                    .filter(([category]) => selected.has(category))
+                    .reduce((sum, [, n]) => sum + n, 0);
+                if (count > 0) {
+                    markers.set(`cluster-${props.cluster_id}`, createClusterMarker(feature, count));
                 }
-                content += `</ul>`;
+                return;
             }
 
-            content += `<p><a href="${campus.website}" target="_blank">Официальный сайт</a></p>`;
-
-            infoContent.innerHTML = content;
-            infoPanel.style.display = 'block';
+            if (!selected.has(props.category) || markers.has(props.id)) {
+                return;
+            }
+            if (!markerById.has(props.id)) {
+                markerById.set(props.id, createMarker(feature));
+            }
+            markers.set(props.id, markerById.get(props.id));
         });
-}
\ No newline at end of file
+    });
+
+    // У обычной группы слоев (серверная кластеризация) нет пакетного addLayers
+    layer.clearLayers();
+    if (layer.addLayers) {
+        layer.addLayers(Array.from(markers.values()));
+    } else {
+        markers.forEach(marker => layer.addLayer(marker));
+    }
+}
+
+// Показывает информационную панель с HTML-кодом, подготовленным на сервере
+function showDetailsHtml(html) {
+    const infoPanel = document.getElementById('info-panel');
+    const infoTitle = document.getElementById('info-title');
+    const infoContent = document.getElementById('info-content');
+
+    infoContent.innerHTML = html;
+    infoTitle.textContent = infoContent.firstElementChild ? infoContent.firstElementChild.dataset.name : '';
+    infoPanel.style.display = 'block';
+}
+
+// Функция для отображения детальной информации о корпусе
+function showDetails(campusId) {
+    fetch(`/campus/${campusId}/details`)
+        .then(checkDataVersion)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Корпус ${campusId} не найден`);
+            }
+            return response.text();
+        })
+        .then(showDetailsHtml)
+        .catch(error => console.error('Ошибка загрузки информации о корпусе:', error));
+}
@@ -0,0 +1,18 @@
+"""Проверки поиска корпусов по словоформам"""
+import os
+import sys
+
+import pytest
+
+# Приложение читает данные и шаблоны по путям относительно своего каталога
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.getcwd())
+
+import app  # noqa: E402
+
+
+@pytest.mark.parametrize("term", ["биолог", "биология", "биологический"])
+def test_search_finds_campus_by_word_form(term):
+    """Словоформы находят "Биолого-почвенный факультет", как и прежний поиск по подстроке"""
+    ids = [campus["id"] for _, campus in app.search_campuses(term)]
+    assert 3 in ids